@@ -1,7 +1,10 @@
+import os
 import sys
 sys.path.append("/home/seniord/ECE_1896/xarm_case_a/serial_bus_servo_controller_python_module/scripts")
 
 import serial_bus_servo_controller as sbsc
+import sbs_worker
+import sbs_telemetry
 import time
 import subprocess
 import serial
@@ -19,7 +22,11 @@ def ngrok_init():
 	
 # Initialize Ngrok servo controller
 ngrok_init()
-controller = sbsc.SBS_Controller("/dev/ttyS0")
+controller = sbsc.SBS_Controller(os.environ.get("SBS_DEVICE", "/dev/ttyS0"))
+# Flask serves requests on several threads: let a single worker thread own the serial port.
+serial_worker = sbs_worker.SBS_Worker(controller)
+# Servo positions and battery voltage read in the background, served from cache.
+telemetry = sbs_telemetry.TelemetryPoller(controller).start()
 	
 @app.route('/move', methods=['POST'])
 def move():
@@ -35,5 +42,19 @@ def move():
 	except Exception as e:
 		return jsonify({"error": str(e)}), 500
 		
+@app.route('/telemetry', methods=['GET'])
+def get_telemetry():
+	snap = telemetry.snapshot
+	return jsonify({
+		"servo_id": snap.servo_id,
+		"position": snap.positions,
+		"position_age": snap.positions_age(),
+		"battery_voltage": snap.battery_voltage,
+		"battery_age": snap.battery_age(),
+		"timeouts": snap.timeouts,
+		"errors": snap.errors,
+		"last_error": snap.last_error
+	})
+		
 if __name__ == '__main__':
 	app.run(host='0.0.0.0', port=5000)
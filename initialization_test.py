@@ -1,9 +1,10 @@
+import os
 import sys
 sys.path.append("/home/raspberrypi/ECE_1896/xarm_case_a/serial_bus_servo_controller_python_module/scripts")
 
 import serial_bus_servo_controller as sbsc
 import time
-controller = sbsc.SBS_Controller("/dev/ttyAMA0")
+controller = sbsc.SBS_Controller(os.environ.get("SBS_DEVICE", "/dev/ttyAMA0"))
 
 # This is an example of rotating servos with IDs 1 and 2 to positions 100 and 400, respectively, in 500ms.
 
@@ -1,9 +1,10 @@
+import os
 import sys
 sys.path.append("/home/seniord/ECE_1896/xarm_case_a/serial_bus_servo_controller_python_module/scripts")
 
 import serial_bus_servo_controller as sbsc
 import time
-controller = sbsc.SBS_Controller("/dev/ttyS0")
+controller = sbsc.SBS_Controller(os.environ.get("SBS_DEVICE", "/dev/ttyS0"))
 
 servo_id = 5
 
@@ -0,0 +1,54 @@
+# coding: utf-8
+"""
+Microbenchmark of move packet encoding (no hardware needed).
+
+    python benchmarks/bench_encoder.py
+
+Compares, per packet of 6 servos:
+    bytearray  sbs_protocol.encode_servo_move (fresh bytearray + extend per field)
+    pack_into  sbs_encoder.MoveEncoder.encode (struct.pack_into into a reused buffer)
+    trajectory sbs_encoder.encode_trajectory (N waypoints into one contiguous buffer)
+"""
+import os
+import sys
+import timeit
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+import numpy as np
+
+import sbs_encoder
+import sbs_protocol
+
+SERVO_ID = [6, 5, 4, 3, 2, 1]
+POSITIONS = [480, 470, 500, 537, 460, 900]
+N = 1000
+
+
+def per_packet_us(stmt, number, packets=1):
+    best = min(timeit.repeat(stmt, number=number, repeat=5))
+    return best / number / packets * 1e6
+
+
+def main():
+    encoder = sbs_encoder.MoveEncoder()
+    waypoints = np.random.default_rng(0).integers(0, 1000, size=(N, len(SERVO_ID)))
+    out = bytearray(N * sbs_encoder.packet_size(len(SERVO_ID)))
+
+    # All encoders must produce the same bytes.
+    assert bytes(encoder.encode(SERVO_ID, POSITIONS, 900)) == bytes(sbs_protocol.encode_servo_move(SERVO_ID, POSITIONS, 900))
+    size = sbs_encoder.packet_size(len(SERVO_ID))
+    traj = sbs_encoder.encode_trajectory(SERVO_ID, waypoints, 20)
+    assert traj[size:2 * size] == sbs_protocol.encode_servo_move(SERVO_ID, list(waypoints[1]), 20)
+
+    results = [
+        ("bytearray", per_packet_us(lambda: sbs_protocol.encode_servo_move(SERVO_ID, POSITIONS, 900), 20000)),
+        ("pack_into", per_packet_us(lambda: encoder.encode(SERVO_ID, POSITIONS, 900), 20000)),
+        (f"trajectory (N={N})", per_packet_us(lambda: sbs_encoder.encode_trajectory(SERVO_ID, waypoints, 20, out), 200, N)),
+    ]
+    for name, us in results:
+        print(f"{name:<20} {us:8.3f} us/packet")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# coding: utf-8
+"""
+Per-frame cost of IK + calibration for one target (no hardware needed).
+
+    python benchmarks/bench_ik.py
+
+numpy scalar  the previous move_end_effector path: NumPy ufuncs on Python floats,
+              deg/rad conversions and np.interp per joint
+numpy batch   ArmModel.ik_batch + Calibration.to_positions on a single row
+math scalar   ArmModel.ik (sbs_kinematics.ik_scalar) + Calibration.to_positions_radians (move_end_effector)
+"""
+import math
+import os
+import sys
+import timeit
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+import numpy as np
+
+import sbs_arm
+
+TARGET = (20.0, 3.0, 5.0, 0.0)
+WRIST = 90.0
+
+
+ARM = sbs_arm.ArmModel.load()
+
+
+def numpy_scalar(x3, y3, z3, p, wrist):
+    l1, l2, l3 = ARM.links
+    phi = np.deg2rad(p)
+    r3 = np.sqrt(x3**2 + y3**2)
+    theta_base = np.arctan2(y3, x3)
+    r2 = r3 - l3*np.cos(phi)
+    z2 = z3 - l3*np.sin(phi)
+    c2 = (r2**2 + z2**2 - l1**2 - l2**2)/(2*l1*l2)
+    c2 = np.clip(c2, -1.0, 1.0)
+    s2 = -np.sqrt(1-c2**2)
+    theta_2 = np.arctan2(s2, c2)
+    s1 = ((l1 + l2*c2)*z2 - l2*s2*r2)/(r2**2 + z2**2)
+    c1 = ((l1 + l2*c2)*r2 + l2*s2*z2)/(r2**2 + z2**2)
+    theta_1 = np.arctan2(s1, c1)
+    theta_3 = phi - theta_1 - theta_2
+    angles = {6: np.rad2deg(theta_base), 5: np.rad2deg(theta_1), 4: np.rad2deg(theta_2), 3: np.rad2deg(theta_3), 2: wrist}
+    positions = []
+    for sid, angle in angles.items():
+        r = ARM.calibration.servo_ranges[sid]
+        angle = max(min(angle, r["angle_max"]), r["angle_min"])
+        positions.append(int(np.interp(angle, [r["angle_min"], r["angle_max"]], [r["pos_min"], r["pos_max"]])))
+    return positions
+
+
+def numpy_batch(calibration, x3, y3, z3, p, wrist):
+    angles, _ = ARM.ik_batch([[x3, y3, z3, p]])
+    return calibration.to_positions(np.append(angles[0], wrist))[0].tolist()
+
+
+def math_scalar(calibration, x3, y3, z3, p, wrist):
+    theta_base, theta_1, theta_2, theta_3, _ = ARM.ik(x3, y3, z3, math.radians(p))
+    return calibration.to_positions_radians((theta_base, theta_1, theta_2, theta_3, math.radians(wrist)))[0]
+
+
+def main():
+    calibration = ARM.calibration
+
+    # The paths must agree (up to one count where float rounding lands on an integer boundary).
+    rng = np.random.default_rng(0)
+    worst = 0
+    for x, y, z in rng.uniform(-30, 30, size=(5000, 3)):
+        ref = numpy_scalar(x, y, z, 0.0, WRIST)
+        worst = max(worst, max(abs(a - b) for a, b in zip(ref, math_scalar(calibration, x, y, z, 0.0, WRIST))))
+    print(f"max position difference numpy scalar vs math scalar: {worst} count(s)")
+
+    results = [
+        ("numpy scalar", lambda: numpy_scalar(*TARGET, WRIST)),
+        ("numpy batch", lambda: numpy_batch(calibration, *TARGET, WRIST)),
+        ("math scalar", lambda: math_scalar(calibration, *TARGET, WRIST)),
+    ]
+    base = None
+    for name, func in results:
+        us = min(timeit.repeat(func, number=5000, repeat=5)) / 5000 * 1e6
+        base = base or us
+        print(f"{name:<14} {us:8.2f} us/target  ({base / us:5.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# coding: utf-8
+"""
+End-to-end benchmark of IK -> encoding -> serial link, against the pty emulator (no hardware needed).
+
+    python benchmarks/bench_pipeline.py
+
+Sends a stream of end effector targets through SBS_Controller.move_end_effector at a fixed rate,
+with an SBS_Worker owning the port as in tcp/tcp_server.py, and reports how many move packets
+reached the emulated controller and how late the last one arrived.
+"""
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+import numpy as np
+
+import sbs_emulator
+import sbs_worker
+import serial_bus_servo_controller as sbsc
+
+RATE_HZ = 60
+DURATION = 3.0
+
+
+def main():
+    with sbs_emulator.SBS_Emulator() as emulator:
+        controller = sbsc.SBS_Controller(emulator.port)
+        worker = sbs_worker.SBS_Worker(controller)
+
+        n = int(RATE_HZ * DURATION)
+        angles = np.linspace(-0.6, 0.6, n)
+        targets = np.stack([20 * np.cos(angles), 20 * np.sin(angles), np.full(n, 5.0)], axis=1)
+
+        solve = []
+        t0 = time.monotonic()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for i, (x, y, z) in enumerate(targets):
+                t = time.monotonic()
+                controller.move_end_effector(x, y, z, 0, 90, 500, 100)
+                solve.append(time.monotonic() - t)
+                time.sleep(max(t0 + (i + 1) / RATE_HZ - time.monotonic(), 0))
+        sent = time.monotonic()
+        while worker.pending_moves():
+            time.sleep(0.001)
+        drained = time.monotonic()
+        time.sleep(0.1)     # let the emulator receive the last packet
+        worker.stop()
+
+        stats = worker.stats()
+        print(f"targets sent        {n} at {RATE_HZ} Hz")
+        print(f"packets on the bus  {len(emulator.frames)}")
+        print(f"targets merged      {stats['merged']}")
+        print(f"bus utilization     {stats['utilization']*100:.0f}%")
+        print(f"solve + submit      {np.mean(solve)*1e6:.0f} us mean, {np.max(solve)*1e6:.0f} us max")
+        print(f"drain after stream  {(drained - sent)*1e3:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# coding: utf-8
+"""
+Speed and accuracy of the IK solvers of sbs_arm (no hardware needed).
+
+    python benchmarks/bench_solvers.py [samples]
+
+Every solver of sbs_arm.SOLVERS solves the same targets, one at a time (solve) and all at once
+(solve_batch). Targets are drawn in the reachable part of the workspace at pitch 0 deg, plus a
+stream that keeps revisiting 64 poses, like a VR client cycling through a small set of targets.
+Accuracy is the end effector position error of the returned angles through forward kinematics.
+"""
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+import numpy as np
+
+import sbs_arm
+
+
+def sample_targets(arm, n, rng):
+    """
+    return:
+        targets: (n, 4) reachable (x, y, z, 0) rows
+    """
+    rows = []
+    while sum(len(r) for r in rows) < n:
+        targets = np.zeros((n, 4))
+        targets[:, :3] = rng.uniform(-arm.extent, arm.extent, size=(n, 3))
+        _, valid = arm.ik_batch(targets)
+        rows.append(targets[valid])
+    return np.concatenate(rows)[:n]
+
+
+def position_error(arm, targets, angles):
+    """
+    return:
+        error: (N,) end effector position error (mm)
+    """
+    return 10 * np.linalg.norm(arm.fk_batch(angles)[:, :3] - targets[:, :3], axis=1)
+
+
+def main():
+    samples = int(float(sys.argv[1])) if len(sys.argv) > 1 else 20_000
+    arm = sbs_arm.ArmModel.load()
+    rng = np.random.default_rng(0)
+    targets = sample_targets(arm, samples, rng)
+    revisits = targets[rng.integers(0, 64, size=samples)]
+    print(f"Arm links {arm.links} cm, {samples} reachable targets at pitch 0 deg")
+    print(f"{'solver':<8} {'solve':>10} {'revisits':>10} {'batch':>12} {'err median':>11} {'err max':>9}")
+
+    for kind in sbs_arm.SOLVERS:
+        solver = arm.solver(kind)
+        timings = []
+        for rows in (targets, revisits):
+            t0 = time.perf_counter()
+            for x, y, z, p in rows.tolist():
+                solver.solve(x, y, z, p)
+            timings.append((time.perf_counter() - t0) / len(rows) * 1e6)
+        t0 = time.perf_counter()
+        angles, valid = solver.solve_batch(targets)
+        batch_ns = (time.perf_counter() - t0) / len(targets) * 1e9
+        err = position_error(arm, targets[valid], angles[valid])
+        print(f"{kind:<8} {timings[0]:7.2f} us {timings[1]:7.2f} us {batch_ns:7.0f} ns/t {np.median(err):8.4f} mm {err.max():6.4f} mm")
+        if kind == "table":
+            covered = solver.table.solve_batch(targets)[1].mean()
+            print(f"{'':<8} ({covered:.0%} of the targets interpolated, the others are outside the joint limits or near a singularity)")
+
+
+if __name__ == "__main__":
+    main()
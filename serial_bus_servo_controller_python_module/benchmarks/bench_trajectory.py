@@ -0,0 +1,133 @@
+# coding: utf-8
+"""
+Tracking error and bus traffic of joint space trajectories against linear Cartesian steps (no hardware needed).
+
+    python benchmarks/bench_trajectory.py
+
+The arm visits a few poses, one second per segment, with every scheme sampled at several rates:
+    linear   straight Cartesian lines, every sample solved with IK (sbs_executor.TrajectoryExecutor)
+    minjerk  sbs_trajectory minimum jerk in joint space, at rest at every pose
+    spline   sbs_trajectory clamped cubic spline in joint space, through the poses without stopping
+Each packet moves the servos linearly to its sample over one period, as the servos (and sbs_emulator) do.
+    track     largest end effector distance (mm) between that motion and the scheme's own continuous reference
+    off line  largest distance (mm) of the reference from the straight lines between the poses
+    accel     largest joint acceleration (deg/s^2) of the motion, from the velocity change between periods
+    bus       share of the 9600 baud link the packets use
+"""
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+import numpy as np
+
+import sbs_arm
+import sbs_encoder
+import sbs_scheduler
+import sbs_trajectory
+
+POSES = [(20, 0, 10, 0), (15, 10, 14, 0), (8, 16, 10, 0), (16, -8, 8, 0), (20, 0, 10, 0)]   # straight lines within the joint limits
+SEGMENT_TIME = 1.0      # s
+RATES = (5, 10, 20, 50)     # Hz
+WRIST, GRIP = 90, 500
+FINE = 0.001            # s, resolution of the error evaluation
+
+
+def solve_chain(arm, poses):
+    """
+    return:
+        joints: (N, 4) deg, every pose solved with ik_nearest from the previous one
+    """
+    joints, previous = [], None
+    for x, y, z, phi in np.asarray(poses).tolist():
+        *angles, _, _ = arm.ik_nearest(x, y, z, np.radians(phi), previous)
+        joints.append(angles)
+        previous = angles
+    return np.rad2deg(joints)
+
+
+def cartesian_reference(times, t):
+    """
+    return:
+        poses: (K, 4) on the straight lines between POSES at times t
+    """
+    poses = np.asarray(POSES, dtype=float)
+    return np.column_stack([np.interp(t, times, poses[:, i]) for i in range(4)])
+
+
+def linear_scheme(arm, times, rate_hz):
+    """
+    return:
+        sample times (K,), joint samples (K, 4) deg, continuous reference function of t -> (N, 3) cm
+    """
+    period = 1.0 / rate_hz
+    t = np.minimum(np.arange(1, int(np.ceil(times[-1] / period - 1e-9)) + 1) * period, times[-1])
+    samples = solve_chain(arm, cartesian_reference(times, t))
+    return t, samples, lambda tf: cartesian_reference(times, tf)[:, :3]
+
+
+def joint_scheme(arm, times, rate_hz, profile):
+    trajectory = sbs_trajectory.JointTrajectory.through_poses(arm, POSES, times, WRIST, GRIP, profile=profile, rate_hz=rate_hz)
+    waypoints = trajectory.waypoints
+    reference = lambda tf: arm.fk_batch(sbs_trajectory.PROFILES[profile](waypoints, times, tf)[:, :4])[:, :3]
+    return trajectory.times, trajectory.samples[:, :4], reference
+
+
+def servo_motion(arm, start, t, samples, tf):
+    """
+    return:
+        angles: (len(tf), 4) deg, the quantized positions reached linearly over each period
+    """
+    positions, _ = arm.calibration.to_positions(np.column_stack([samples, np.full(len(samples), WRIST)]))
+    angles = arm.calibration.to_angles(positions)[:, :4]
+    knots_t = np.concatenate([[0.0], t])
+    knots = np.vstack([start, angles])
+    return np.column_stack([np.interp(tf, knots_t, knots[:, j]) for j in range(4)]), knots_t, knots
+
+
+def off_line(reference_xyz, tf, times):
+    """
+    return:
+        largest distance (cm) of the reference points from the straight segment of their time
+    """
+    poses = np.asarray(POSES, dtype=float)[:, :3]
+    seg = np.clip(np.searchsorted(times, tf, side="right") - 1, 0, len(times) - 2)
+    a, b = poses[seg], poses[seg + 1]
+    ab = b - a
+    u = np.clip(np.einsum("ij,ij->i", reference_xyz - a, ab) / np.einsum("ij,ij->i", ab, ab), 0, 1)
+    return np.linalg.norm(reference_xyz - (a + u[:, None] * ab), axis=1).max()
+
+
+def main():
+    arm = sbs_arm.ArmModel.load()
+    times = np.arange(len(POSES)) * SEGMENT_TIME
+    tf = np.arange(0, times[-1] + FINE / 2, FINE)
+    start = solve_chain(arm, POSES[:1])[0]
+    size = sbs_encoder.packet_size(6)
+    print(f"{len(POSES) - 1} segments of {SEGMENT_TIME:g} s, {size} byte packets")
+    print(f"{'scheme':<8} {'rate':>5} {'packets':>8} {'plan ms':>8} {'track mm':>9} {'off line':>9} {'accel':>8} {'bus':>6}")
+    for rate_hz in RATES:
+        for scheme in ("linear", "minjerk", "spline"):
+            t0 = time.perf_counter()
+            if scheme == "linear":
+                t, samples, reference = linear_scheme(arm, times, rate_hz)
+                positions, _ = arm.calibration.to_positions(np.column_stack([samples, np.full(len(samples), WRIST)]))
+                sbs_encoder.encode_trajectory(list(arm.calibration.servo_id) + [1],
+                                              np.column_stack([positions, np.full(len(samples), GRIP)]), int(1000 / rate_hz))
+            else:
+                t, samples, reference = joint_scheme(arm, times, rate_hz, scheme)
+            plan_ms = (time.perf_counter() - t0) * 1000
+            motion, knots_t, knots = servo_motion(arm, start, t, samples, tf)
+            reference_xyz = reference(tf)
+            track = 10 * np.linalg.norm(arm.fk_batch(motion)[:, :3] - reference_xyz, axis=1).max()
+            velocity = np.diff(knots, axis=0) / np.diff(knots_t)[:, None]
+            velocity = np.vstack([np.zeros(4), velocity, np.zeros(4)])     # from rest, to rest
+            accel = np.abs(np.diff(velocity, axis=0)).max() * rate_hz
+            bus = sbs_scheduler.wire_time(len(t) * size, 9600) / times[-1]
+            print(f"{scheme:<8} {rate_hz:>3} Hz {len(t):>8} {plan_ms:>8.2f} {track:>9.2f} {10 * off_line(reference_xyz, tf, times):>9.2f} "
+                  f"{accel:>8.0f} {bus:>6.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+# coding: utf-8
+"""
+Serial bus regression checks of SBS_Controller and SBS_Worker against the emulator (no hardware needed).
+
+    python benchmarks/verify_bus.py
+
+Each check prints OK or FAIL; the script exits with status 1 when one fails.
+    mixed times   pending moves with different move times, together longer than the BusScheduler budget,
+                  must all reach the servos (they used to wait for each other forever)
+    stop          calls still pending when the worker stops are run on the port directly
+    late reply    the reply to a request that timed out is not returned for the next request
+    async late    same for AsyncSBS_Controller
+    async lost    after a reply that never comes, the next requests of the same command are answered
+    planned merge a planned move merged into by a nearer one is not sent with the duration of the short step
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+import serial_bus_servo_controller as sbsc
+import sbs_async
+import sbs_emulator
+import sbs_worker
+from sbs_protocol import SBS_TimeoutError
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def check_mixed_times(em):
+    controller = sbsc.SBS_Controller(em.port)
+    worker = sbs_worker.SBS_Worker(controller)
+    try:
+        controller.cmd_servo_move([6, 5, 4, 3, 2, 1], [500] * 6, 20)
+        controller.cmd_servo_move([6, 5, 4, 3], [600, 610, 620, 630], 120)
+        controller.cmd_servo_move([2, 1], [640, 650], 40)
+        if not wait_for(lambda: worker.pending_moves() == 0):
+            return f"{worker.pending_moves()} moves still pending, {controller.bus.frames} frames sent"
+        time.sleep(0.3)
+        positions = controller.cmd_mult_servo_pos_read([6, 5, 4, 3, 2, 1])
+        if positions != [600, 610, 620, 630, 640, 650]:
+            return f"servos at {positions}"
+    finally:
+        worker.stop()
+    return None
+
+
+def check_stop_runs_calls(em):
+    controller = sbsc.SBS_Controller(em.port)
+    worker = sbs_worker.SBS_Worker(controller)
+    call = sbs_worker._Call(controller.cmd_get_battery_voltage, ())
+    with worker.cond:
+        # Still pending when the worker thread exits.
+        worker.calls.append(call)
+        worker.running = False
+        worker.cond.notify()
+    worker.stop()
+    if not call.done.is_set():
+        return "pending call not run"
+    if call.error is not None:
+        return f"pending call raised {call.error!r}"
+    return None
+
+
+def check_planned_merge(em):
+    controller = sbsc.SBS_Controller(em.port)
+    worker = sbs_worker.SBS_Worker(controller)
+    try:
+        controller.cmd_move_with_angle(-60, 90, -90, 0, 0, 500, 0)
+        time.sleep(0.3)
+        start = {6: controller.cmd_mult_servo_pos_read([6])[0]}
+        # Keep the worker busy so that the far move is still pending when the near one replaces it.
+        threading.Thread(target=worker.call, args=(time.sleep, 0.3)).start()
+        time.sleep(0.05)
+        controller.cmd_move_with_angle(60, 90, -90, 0, 0, 500, None)
+        controller.cmd_move_with_angle(55, 90, -90, 0, 0, 500, None)
+        if not wait_for(lambda: worker.pending_moves() == 0):
+            return f"{worker.pending_moves()} moves still pending"
+        time.sleep(0.1)     # the last packet arrives
+        target = em.servos[6].target
+        expected = controller.planner.duration([6], [target], start)
+        sent = int(round(em.servos[6].duration * 1000))
+        if worker.coalesced == 0:
+            return "the moves were not merged"
+        if sent < expected:
+            return f"servo 6 sent {target - start[6]} positions in {sent} ms, the planner needs {expected} ms"
+    finally:
+        worker.stop()
+    return None
+
+
+def check_late_reply(em):
+    controller = sbsc.SBS_Controller(em.port)
+    controller.cmd_servo_move([6], [123], 0)
+    time.sleep(0.1)
+    controller.timeout = 0.001
+    try:
+        controller.cmd_mult_servo_pos_read([6])
+    except SBS_TimeoutError:
+        pass
+    controller.timeout = 0.5
+    time.sleep(0.1)     # the late reply arrives
+    controller.cmd_servo_move([6], [777], 0)
+    time.sleep(0.1)
+    positions = controller.cmd_mult_servo_pos_read([6])
+    if positions != [777]:
+        return f"read {positions} after moving to [777]"
+    return None
+
+
+def check_async_late_reply(em):
+    async def run():
+        controller = sbs_async.AsyncSBS_Controller(em.port, timeout=0.001)
+        try:
+            await controller.move([6], [123], 0)
+            await asyncio.sleep(0.1)
+            try:
+                await controller.read_positions([6])
+            except SBS_TimeoutError:
+                pass
+            controller.timeout = 0.5
+            await asyncio.sleep(0.1)    # the late reply arrives
+            await controller.move([6], [777], 0)
+            await asyncio.sleep(0.1)
+            positions = await controller.read_positions([6])
+        finally:
+            controller.close()
+        if positions != [777]:
+            return f"read {positions} after moving to [777]"
+        return None
+    return asyncio.run(run())
+
+
+def check_async_lost_reply(em):
+    async def run():
+        controller = sbs_async.AsyncSBS_Controller(em.port, timeout=0.2)
+        em.drop_replies = 1
+        try:
+            try:
+                await controller.read_positions([6])
+                return "the lost reply was answered"
+            except SBS_TimeoutError:
+                pass
+            answered = 0
+            for _ in range(10):
+                try:
+                    await controller.read_positions([6])
+                    answered += 1
+                except SBS_TimeoutError:
+                    pass
+        finally:
+            em.drop_replies = 0
+            controller.close()
+        if answered != 10:
+            return f"{answered} of 10 reads answered after a lost reply"
+        return None
+    return asyncio.run(run())
+
+
+CHECKS = [
+    ("mixed times", check_mixed_times),
+    ("stop", check_stop_runs_calls),
+    ("late reply", check_late_reply),
+    ("async late", check_async_late_reply),
+    ("async lost", check_async_lost_reply),
+    ("planned merge", check_planned_merge),
+]
+
+
+def main():
+    failed = 0
+    with sbs_emulator.SBS_Emulator() as em:
+        for name, check in CHECKS:
+            error = check(em)
+            print(f"{name:<14} {'OK' if error is None else 'FAIL: ' + error}")
+            failed += error is not None
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
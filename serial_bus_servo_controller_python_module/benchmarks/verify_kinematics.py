@@ -0,0 +1,129 @@
+# coding: utf-8
+"""
+IK -> calibration -> FK round trip over the whole workspace (no hardware needed).
+
+    python benchmarks/verify_kinematics.py [samples] [phi] [map.npz]
+
+Targets are drawn uniformly in the cube enclosing the fully stretched arm and sent through
+    nearest_batch (the solution move_end_effector picks with a fixed pitch and no commanded pose yet)
+    -> Calibration.to_positions (clamp to joint limits, quantize to servo counts)
+    -> Calibration.to_angles -> ArmModel.fk_batch
+which is what the servos are commanded to on a first move. Once the arm has moved, move_end_effector
+prefers the solution closest to the commanded joints, which can differ on targets several branches reach
+within the limits, but reaches the same targets. The position error between target and
+achieved pose is summarized per category and as a map over (horizontal distance r, height z),
+saved to map.npz (kinematics_error_map.npz in the temporary directory by default).
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+import numpy as np
+
+import sbs_arm
+import sbs_kinematics
+
+CHUNK = 1_000_000
+MAP_BIN = 1.0   # cm
+
+
+def nearest_batch(arm, targets):
+    """
+    Description: Vectorized ArmModel.ik_nearest without previous: over every branch, each joint turned by
+                 -360, 0 or +360 deg to be the least outside its limits, the solution that is reachable and
+                 the least outside the limits, ties to the lower branch.
+    return:
+        angles: (N, 4) deg
+        valid: (N,) bool
+    """
+    angle_min, angle_max = arm.calibration.angle_min[:4], arm.calibration.angle_max[:4]
+    best_angles = best_valid = best_cost = None
+    for branch in range(len(sbs_kinematics.BRANCHES)):
+        angles, valid = arm.ik_batch(targets, branch)
+        turns = angles[None] + np.array([0.0, -360.0, 360.0])[:, None, None]
+        violation = np.maximum(angle_min - turns, 0.0) + np.maximum(turns - angle_max, 0.0)
+        turn = np.argmin(violation, axis=0)     # first of the least violating turns, like ik_nearest
+        angles = np.take_along_axis(turns, turn[None], 0)[0]
+        cost = np.where(valid, np.take_along_axis(violation, turn[None], 0)[0].sum(axis=1), np.inf)
+        if best_cost is None:
+            best_angles, best_valid, best_cost = angles, valid, cost
+            continue
+        better = cost < best_cost
+        best_angles = np.where(better[:, None], angles, best_angles)
+        best_valid = best_valid | valid
+        best_cost = np.where(better, cost, best_cost)
+    return best_angles, best_valid
+
+
+def round_trip(targets, arm):
+    """
+    return:
+        achieved: (N, 4) poses reached by the commanded servo positions
+        valid: IK found an exact solution
+        clamped: at least one joint was clamped to its limits
+    """
+    angles, valid = nearest_batch(arm, targets)
+    joints = np.concatenate([angles, np.full((len(angles), 1), 90.0)], axis=1)   # wrist rotation, ignored by FK
+    positions, clamped = arm.calibration.to_positions(joints)
+    achieved = arm.fk_batch(arm.calibration.to_angles(positions))
+    return achieved, valid, clamped.any(axis=1)
+
+
+def main():
+    samples = int(float(sys.argv[1])) if len(sys.argv) > 1 else 4_000_000
+    phi = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+    out = sys.argv[3] if len(sys.argv) > 3 else os.path.join(tempfile.gettempdir(), "kinematics_error_map.npz")
+    arm = sbs_arm.ArmModel.load()
+    extent = arm.extent
+    rng = np.random.default_rng(0)
+
+    nbins = int(np.ceil(extent / MAP_BIN))
+    err_sum = np.zeros((nbins, 2 * nbins))
+    err_count = np.zeros((nbins, 2 * nbins))
+    errors = {"exact": [], "clamped": [], "unreachable": []}
+    check = np.empty((1000, 4))
+    check[:, :3] = rng.uniform(-extent, extent, size=(1000, 3))
+    check[:, 3] = phi
+    expected = np.array([np.degrees(arm.ik_nearest(x, y, z, np.radians(p))[:4]) for x, y, z, p in check.tolist()])
+    reachable = nearest_batch(arm, check)[1]
+    assert np.allclose(nearest_batch(arm, check)[0][reachable], expected[reachable], atol=1e-6), "nearest_batch differs from ik_nearest"
+
+    t0 = time.perf_counter()
+    for start in range(0, samples, CHUNK):
+        n = min(CHUNK, samples - start)
+        targets = np.empty((n, 4))
+        targets[:, :3] = rng.uniform(-extent, extent, size=(n, 3))
+        targets[:, 3] = phi
+        achieved, valid, clamped = round_trip(targets, arm)
+        err = np.linalg.norm(achieved[:, :3] - targets[:, :3], axis=1)
+
+        errors["exact"].append(err[valid & ~clamped])
+        errors["clamped"].append(err[valid & clamped])
+        errors["unreachable"].append(err[~valid])
+
+        r = np.hypot(targets[:, 0], targets[:, 1])
+        ri = np.minimum((r / MAP_BIN).astype(int), nbins - 1)
+        zi = np.clip(((targets[:, 2] + extent) / MAP_BIN).astype(int), 0, 2 * nbins - 1)
+        np.add.at(err_sum, (ri, zi), err)
+        np.add.at(err_count, (ri, zi), 1)
+    elapsed = time.perf_counter() - t0
+
+    print(f"{samples} targets at phi = {phi} deg in {elapsed:.1f} s ({elapsed / samples * 1e9:.0f} ns/target)")
+    print(f"{'category':<12} {'share':>7} {'median':>8} {'p99':>8} {'max':>8}  (position error, cm)")
+    for name, chunks in errors.items():
+        e = np.concatenate(chunks)
+        if len(e) == 0:
+            continue
+        print(f"{name:<12} {len(e) / samples:7.1%} {np.median(e):8.3f} {np.percentile(e, 99):8.3f} {e.max():8.3f}")
+
+    with np.errstate(invalid="ignore"):
+        error_map = err_sum / err_count
+    np.savez(out, mean_error=error_map, samples=err_count, bin=MAP_BIN, r0=0.0, z0=-extent)
+    print(f"Mean error map over (r, z) saved to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+# coding: utf-8
+"""
+sbs_arm: The arm model (link lengths and joint calibration) and its IK solvers behind one API.
+
+The model is loaded from arm.json next to this file, the only place the link lengths, joint
+calibration and servo limits are set, so every script, server and precomputed table uses the same arm:
+
+    arm = sbs_arm.ArmModel.load()
+    theta_base, theta_1, theta_2, theta_3, valid = arm.ik(x, y, z, math.radians(phi))
+    solver = arm.solver("cached")          # "scalar", "batch", "table" or "cached"
+    angles, valid = solver.solve_batch(targets)
+
+    python sbs_arm.py                       # print the model
+"""
+import json
+import math
+import os
+
+import numpy as np
+
+import sbs_kinematics
+from sbs_cache import IKCache
+from sbs_calibration import Calibration
+from sbs_iktable import IKTable
+
+DEFAULT_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "arm.json")
+
+
+class ArmModel:
+    def __init__(self, links, servo_ranges, servo_limits):
+        """
+        ArmModel: Link lengths, joint calibration and servo speed limits of the arm.
+        Parameters:
+            links: (l1, l2, l3) in cm, shoulder to elbow, elbow to wrist, wrist to end effector
+            servo_ranges: dict, servo id -> {"angle_min", "angle_max", "pos_min", "pos_max"}
+            servo_limits: dict, servo id -> {"max_speed", "max_accel"} (see sbs_planner.MovePlanner)
+        """
+        self.l1, self.l2, self.l3 = (float(v) for v in links)
+        self.links = (self.l1, self.l2, self.l3)
+        self.extent = self.l1 + self.l2 + self.l3
+        self.calibration = Calibration(servo_ranges)
+        self.servo_limits = servo_limits
+
+    @classmethod
+    def load(cls, path=DEFAULT_CONFIG):
+        """
+        Description: Load the model from a JSON file ({"links": [...], "servo_ranges": {...}, "servo_limits": {...}}).
+                     Every key is required: there are no built-in defaults to silently fall back on.
+        """
+        with open(path) as f:
+            config = json.load(f)
+        servo_ranges = {int(k): v for k, v in config["servo_ranges"].items()}
+        servo_limits = {int(k): v for k, v in config["servo_limits"].items()}
+        return cls(config["links"], servo_ranges, servo_limits)
+
+    def save(self, path=DEFAULT_CONFIG):
+        config = {
+            "links": list(self.links),
+            "servo_ranges": {str(k): v for k, v in self.calibration.servo_ranges.items()},
+            "servo_limits": {str(k): v for k, v in self.servo_limits.items()},
+        }
+        with open(path, "w") as f:
+            json.dump(config, f, indent=1)
+
+    def ik(self, x3, y3, z3, phi, branch=0):
+        """
+        Description: sbs_kinematics.ik_scalar of this arm (phi and angles in rad).
+        """
+        return sbs_kinematics.ik_scalar(x3, y3, z3, phi, self.l1, self.l2, self.l3, branch)
+
+    def ik_batch(self, targets, branch=0):
+        """
+        Description: sbs_kinematics.ik_batch of this arm (deg).
+        """
+        return sbs_kinematics.ik_batch(targets, self.l1, self.l2, self.l3, branch)
+
+    def ik_nearest(self, x3, y3, z3, phi, previous=None):
+        """
+        Description: sbs_kinematics.ik_nearest of this arm within its joint limits (rad).
+        """
+        return sbs_kinematics.ik_nearest(x3, y3, z3, phi, self.l1, self.l2, self.l3, previous, self.calibration.radian_ranges)
+
+    def ik_free_pitch(self, x3, y3, z3, previous=None, preferred=0.0, budget=0.002):
+        """
+        Description: sbs_kinematics.ik_free_pitch of this arm within its joint limits (deg).
+        """
+        return sbs_kinematics.ik_free_pitch(x3, y3, z3, self.calibration.angle_min[:4], self.calibration.angle_max[:4],
+                                            self.l1, self.l2, self.l3, previous, preferred, budget=budget)
+
+    def fk_batch(self, angles):
+        """
+        Description: sbs_kinematics.fk_batch of this arm (deg).
+        """
+        return sbs_kinematics.fk_batch(angles, self.l1, self.l2, self.l3)
+
+    def jacobian(self, theta_base, theta_1, theta_2, theta_3):
+        """
+        Description: sbs_kinematics.jacobian of this arm (rad).
+        """
+        return sbs_kinematics.jacobian(theta_base, theta_1, theta_2, theta_3, self.l1, self.l2, self.l3)
+
+    def solver(self, kind="scalar", **options):
+        """
+        Parameters:
+            kind: str, key of SOLVERS
+            options: keyword arguments of the solver class
+        return:
+            solver with solve(x, y, z, phi) and solve_batch(targets)
+        """
+        return SOLVERS[kind](self, **options)
+
+
+class ScalarSolver:
+    """
+    ScalarSolver: Exact IK, one target at a time with the math module (sbs_kinematics.ik_scalar).
+                  Every solver returns branch 0 (see sbs_kinematics.BRANCHES) in deg:
+                      solve(x, y, z, phi) -> (theta_base, theta_1, theta_2, theta_3), valid
+                      solve_batch(targets (N, 4)) -> angles (N, 4), valid (N,)
+    """
+    def __init__(self, arm):
+        self.arm = arm
+
+    def solve(self, x3, y3, z3, phi):
+        *angles, valid = self.arm.ik(x3, y3, z3, math.radians(phi))
+        return tuple(math.degrees(a) for a in angles), valid
+
+    def solve_batch(self, targets):
+        solutions = [self.solve(*row) for row in np.asarray(targets, dtype=float).tolist()]
+        return np.array([s[0] for s in solutions]).reshape(-1, 4), np.array([s[1] for s in solutions], dtype=bool)
+
+
+class BatchSolver(ScalarSolver):
+    """
+    BatchSolver: Exact IK, vectorized with NumPy (sbs_kinematics.ik_batch).
+    """
+    def solve(self, x3, y3, z3, phi):
+        angles, valid = self.solve_batch([[x3, y3, z3, phi]])
+        return tuple(angles[0].tolist()), bool(valid[0])
+
+    def solve_batch(self, targets):
+        return self.arm.ik_batch(targets)
+
+
+class TableSolver(ScalarSolver):
+    """
+    TableSolver: Interpolated IK from the precomputed table (sbs_iktable.IKTable, rebuilt when the model
+                 changes); targets the table does not cover are solved exactly.
+    """
+    def __init__(self, arm, **parameters):
+        super().__init__(arm)
+        self.table = IKTable.load_or_build(arm=arm, **parameters)
+
+    def solve(self, x3, y3, z3, phi):
+        angles = self.table.solve(x3, y3, z3, math.radians(phi))
+        if angles is None:
+            return super().solve(x3, y3, z3, phi)
+        return tuple(math.degrees(a) for a in angles), True
+
+    def solve_batch(self, targets):
+        targets = np.asarray(targets, dtype=float)
+        angles, covered = self.table.solve_batch(targets)
+        valid = covered.copy()
+        if not covered.all():
+            angles[~covered], valid[~covered] = self.arm.ik_batch(targets[~covered])
+        return angles, valid
+
+
+class CachedSolver(ScalarSolver):
+    """
+    CachedSolver: ScalarSolver behind a quantized LRU cache (sbs_cache.IKCache); see cache.stats().
+    """
+    def __init__(self, arm, quantum=0.1, maxsize=1024):
+        super().__init__(arm)
+        self.cache = IKCache(quantum, maxsize)
+
+    def solve(self, x3, y3, z3, phi):
+        key = self.cache.key(x3, y3, z3, phi)
+        solution = self.cache.get(key)
+        if solution is None:
+            solution = super().solve(x3, y3, z3, phi)
+            self.cache.put(key, solution)
+        return solution
+
+
+SOLVERS = {
+    "scalar": ScalarSolver,
+    "batch": BatchSolver,
+    "table": TableSolver,
+    "cached": CachedSolver,
+}
+
+
+if __name__ == "__main__":
+    arm = ArmModel.load()
+    print(f"Links (cm): {arm.links}, reach {arm.extent} cm")
+    for sid, lo, hi in zip(arm.calibration.servo_id, arm.calibration.angle_min, arm.calibration.angle_max):
+        limits = arm.servo_limits[sid]
+        print(f"Servo {sid}: {lo:g} to {hi:g} deg, up to {limits['max_speed']:g} deg/s, {limits['max_accel']:g} deg/s^2")
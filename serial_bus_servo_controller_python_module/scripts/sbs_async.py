@@ -0,0 +1,133 @@
+# coding: utf-8
+import asyncio
+import os
+from collections import deque
+
+import serial
+
+import sbs_protocol
+from sbs_encoder import MoveEncoder
+from sbs_protocol import FrameParser, RESPONSE_FORMATS, SBS_TimeoutError
+
+
+class AsyncSBS_Controller:
+    def __init__(self, dev, baud_rate=9600, timeout=0.5):
+        """
+        AsyncSBS_Controller: asyncio version of SBS_Controller.
+                             The serial port is opened non-blocking and watched by the running event loop,
+                             so any number of coroutines (client sessions, telemetry pollers) can share
+                             the controller on one thread. Packets are encoded and decoded like in
+                             SBS_Controller: moves with a MoveEncoder, the rest with the sbs_protocol functions.
+                             Must be created from a coroutine; POSIX only (uses loop.add_reader).
+        functions:
+            move
+            read_positions
+            battery_voltage
+            unload
+            close
+        Parameters:
+            dev, baud_rate, timeout: same as SBS_Controller
+        """
+        self.timeout = timeout
+        self.loop = asyncio.get_running_loop()
+        self.ser = serial.Serial(dev, baud_rate, timeout=0)
+        self.fd = self.ser.fileno()
+        self.parser = FrameParser(RESPONSE_FORMATS)
+        self.encoder = MoveEncoder()    # its buffer is only used under write_lock
+        self.waiters = {}   # command value -> deque of futures waiting for a response, oldest first
+        self.request_locks = {}     # command value -> asyncio.Lock, one request per command in flight
+        self.write_lock = asyncio.Lock()
+        self.loop.add_reader(self.fd, self._on_readable)
+
+    def _on_readable(self):
+        """
+        Description: Hand every frame received so far to the request waiting for it. A frame nobody waits
+                     for (the reply to a request that timed out) is dropped.
+        """
+        while True:
+            try:
+                data = os.read(self.fd, 4096)
+            except BlockingIOError:
+                return
+            if not data:
+                return
+            for frame in self.parser.feed(data):
+                waiters = self.waiters.get(frame[3])
+                while waiters:
+                    future = waiters.popleft()
+                    if not future.done():
+                        future.set_result(frame)
+                        break
+
+    async def _write(self, buf):
+        view = memoryview(buf)
+        while view:
+            try:
+                n = os.write(self.fd, view)
+            except BlockingIOError:
+                n = 0
+            view = view[n:]
+            if view:
+                writable = self.loop.create_future()
+                self.loop.add_writer(self.fd, writable.set_result, None)
+                try:
+                    await writable
+                finally:
+                    self.loop.remove_writer(self.fd)
+
+    async def _request(self, buf, cmd):
+        # Like SBS_Controller, at most one request per command is in flight: a reply to cmd received before
+        # the request is written answers an earlier request that timed out, and is dropped by _on_readable.
+        async with self.request_locks.setdefault(cmd, asyncio.Lock()):
+            future = self.loop.create_future()
+            async with self.write_lock:
+                self._on_readable()
+                self.waiters.setdefault(cmd, deque()).append(future)
+                await self._write(buf)
+            try:
+                return await asyncio.wait_for(future, self.timeout)
+            except asyncio.TimeoutError:
+                self.waiters[cmd].remove(future)
+                raise SBS_TimeoutError(cmd, bytes(self.parser.buf)) from None
+
+    async def move(self, servo_id, angle_position, time):
+        """
+        Description: Same as SBS_Controller.cmd_servo_move.
+        """
+        async with self.write_lock:
+            await self._write(self.encoder.encode(servo_id, angle_position, time))
+
+    async def unload(self, servo_id):
+        """
+        Description: Same as SBS_Controller.cmd_mult_servo_unload.
+        """
+        async with self.write_lock:
+            await self._write(sbs_protocol.encode_mult_servo_unload(servo_id))
+
+    async def read_positions(self, servo_id):
+        """
+        Description: Same as SBS_Controller.cmd_mult_servo_pos_read.
+        raises:
+            SBS_TimeoutError: no response before the timeout
+        """
+        frame = await self._request(sbs_protocol.encode_mult_servo_pos_read(servo_id),
+                                    sbs_protocol.CMD_MULT_SERVO_POS_READ)
+        return sbs_protocol.decode_mult_servo_pos(frame, servo_id)
+
+    async def battery_voltage(self):
+        """
+        Description: Same as SBS_Controller.cmd_get_battery_voltage.
+        raises:
+            SBS_TimeoutError: no response before the timeout
+        """
+        frame = await self._request(sbs_protocol.encode_get_battery_voltage(),
+                                    sbs_protocol.CMD_GET_BATTERY_VOLTAGE)
+        return sbs_protocol.decode_battery_voltage(frame)
+
+    def close(self):
+        self.loop.remove_reader(self.fd)
+        for waiters in self.waiters.values():
+            for future in waiters:
+                future.cancel()
+        self.waiters.clear()
+        self.ser.close()
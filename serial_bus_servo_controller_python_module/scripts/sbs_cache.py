@@ -0,0 +1,67 @@
+# coding: utf-8
+import threading
+from collections import OrderedDict
+
+
+class IKCache:
+    def __init__(self, quantum=0.1, maxsize=1024):
+        """
+        IKCache: Bounded LRU cache of move_end_effector results.
+                 Targets are quantized before lookup, so a VR client cycling through the same poses
+                 skips IK and calibration entirely. A hit returns the result of the
+                 first target seen in the quantization cell (at most quantum/2 away on each axis).
+        Parameters:
+            quantum: float
+                quantization step of x, y, z (cm) and of the pitch and wrist angles (deg)
+                e.g. quantum = 0.1
+            maxsize: int
+                number of entries kept, least recently used ones are evicted first
+        """
+        self.quantum = quantum
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, x, y, z, p, wrist=0.0):
+        q = self.quantum
+        return (round(x / q), round(y / q), round(z / q), round(p / q), round(wrist / q))
+
+    def get(self, key):
+        """
+        return:
+            entry, or None on a miss
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self.entries),
+                "evictions": self.evictions,
+            }
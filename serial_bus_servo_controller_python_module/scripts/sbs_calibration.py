@@ -0,0 +1,103 @@
+# coding: utf-8
+import math
+
+import numpy as np
+
+# Joint order used by cmd_move_with_angle: base, shoulder, elbow, wrist pitch, wrist rotation.
+JOINT_SERVO_ID = (6, 5, 4, 3, 2)
+
+
+class Calibration:
+    def __init__(self, servo_ranges, servo_id=JOINT_SERVO_ID):
+        """
+        Calibration: Linear joint angle (deg) <-> servo position mapping of every joint, built once.
+                     Limits and slopes are kept in arrays so a whole joint vector, or a batch of them,
+                     is converted with a few NumPy operations.
+        Parameters:
+            servo_ranges: dict
+                servo id -> {"angle_min", "angle_max", "pos_min", "pos_max"}, e.g. the "servo_ranges" of arm.json
+            servo_id: tuple
+                joint order of the angle vectors, e.g. JOINT_SERVO_ID
+        """
+        self.servo_ranges = servo_ranges
+        self.servo_id = tuple(servo_id)
+        ranges = [servo_ranges[sid] for sid in self.servo_id]
+        self.angle_min = np.array([r["angle_min"] for r in ranges], dtype=float)
+        self.angle_max = np.array([r["angle_max"] for r in ranges], dtype=float)
+        self.pos_min = np.array([r["pos_min"] for r in ranges], dtype=float)
+        self.pos_max = np.array([r["pos_max"] for r in ranges], dtype=float)
+        # position = pos_min + slope * (angle - angle_min), the same expression np.interp evaluates.
+        self.slope = (self.pos_max - self.pos_min) / (self.angle_max - self.angle_min)
+        # Per joint (angle_min, angle_max, pos_min, pos_max, slope) in radians and plain floats, for to_positions_radians.
+        self.radian_ranges = tuple(zip(np.deg2rad(self.angle_min).tolist(), np.deg2rad(self.angle_max).tolist(),
+                                       self.pos_min.tolist(), self.pos_max.tolist(), np.rad2deg(self.slope).tolist()))
+
+    def to_positions(self, angles):
+        """
+        Description: Clamp joint angles to their limits and convert them to servo positions.
+        Parameters:
+            angles: array-like, shape (5,) or (N, 5) (deg, in servo_id order)
+                (note. NaN angles give undefined positions, callers must check them.)
+        return:
+            positions: int ndarray, same shape as angles
+            clamped: bool ndarray, same shape as angles, True where the angle was out of range
+        """
+        angles = np.asarray(angles, dtype=float)
+        limited = np.clip(angles, self.angle_min, self.angle_max)
+        clamped = limited != angles
+        positions = self.pos_min + self.slope * (limited - self.angle_min)
+        positions = np.where(limited == self.angle_max, self.pos_max, positions).astype(int)   # exact at the upper limit, like np.interp
+        return positions, clamped
+
+    def to_positions_radians(self, angles):
+        """
+        Description: Scalar fast path of to_positions for one joint vector given in radians,
+                     with plain Python floats (no NumPy overhead).
+        Parameters:
+            angles: sequence of 5 floats (rad, in servo_id order)
+        return:
+            positions: list of int
+            clamped: list of bool
+        raises:
+            ValueError: an angle is NaN or infinite
+        """
+        positions = []
+        clamped = []
+        for angle, (lo, hi, p_lo, p_hi, slope) in zip(angles, self.radian_ranges):
+            if not math.isfinite(angle):
+                raise ValueError(f"Joint angles must be finite: {angles}")
+            if angle >= hi:
+                clamped.append(angle > hi)
+                positions.append(int(p_hi))
+            else:
+                clamped.append(angle < lo)
+                positions.append(int(p_lo + slope * (max(angle, lo) - lo)))
+        return positions, clamped
+
+    def to_angles(self, positions):
+        """
+        Description: Inverse of to_positions (without clamping).
+        Parameters:
+            positions: array-like, shape (5,) or (N, 5)
+        return:
+            angles: float ndarray (deg)
+        """
+        positions = np.asarray(positions, dtype=float)
+        return self.angle_min + (positions - self.pos_min) / self.slope
+
+    def to_angles_radians(self, positions):
+        """
+        Description: Scalar fast path of to_angles, in radians.
+        Parameters:
+            positions: sequence of up to 5 servo positions (in servo_id order)
+        return:
+            angles: list of float (rad)
+        """
+        return [lo + (position - p_lo) / slope for position, (lo, _, p_lo, _, slope) in zip(positions, self.radian_ranges)]
+
+    def clamped_servos(self, clamped):
+        """
+        return:
+            servo_id: list of the servo ids flagged in a (5,) clamped mask
+        """
+        return [sid for sid, c in zip(self.servo_id, clamped) if c]
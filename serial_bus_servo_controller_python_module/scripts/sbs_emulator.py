@@ -0,0 +1,187 @@
+# coding: utf-8
+"""
+sbs_emulator: Serial Bus Servo Controller emulated on a pseudo-terminal.
+
+Runs the controller protocol on the slave side of a pty so every script can be used
+without the board (Linux/macOS only):
+
+    python sbs_emulator.py
+    SBS_DEVICE=/dev/pts/3 python ../../tcp/tcp_server.py
+
+or from Python:
+
+    with SBS_Emulator() as emulator:
+        controller = sbsc.SBS_Controller(emulator.port)
+
+Supported command values: 0x03 (move), 0x0F (battery voltage), 0x14 (unload), 0x15 (position read).
+Servos move linearly from their current position to the target over the commanded time,
+and bytes are paced at the configured baud rate in both directions.
+"""
+import os
+import select
+import threading
+import time
+import tty
+
+import sbs_protocol
+from sbs_protocol import FrameParser, REQUEST_FORMATS
+from sbs_scheduler import wire_time
+
+
+class EmulatedServo:
+    def __init__(self, position=500):
+        self.start = position
+        self.target = position
+        self.t_start = 0.0
+        self.duration = 0.0
+        self.loaded = True
+
+    def position(self, now):
+        if not self.loaded or self.duration <= 0 or now >= self.t_start + self.duration:
+            return self.target
+        ratio = (now - self.t_start) / self.duration
+        return int(round(self.start + (self.target - self.start) * ratio))
+
+    def move(self, target, duration, now):
+        self.start = self.position(now)
+        self.target = target
+        self.t_start = now
+        self.duration = duration
+        self.loaded = True
+
+    def unload(self, now):
+        # The motor stops where it is.
+        self.target = self.position(now)
+        self.duration = 0.0
+        self.loaded = False
+
+
+class SBS_Emulator:
+    def __init__(self, baud_rate=9600, servo_ids=(1, 2, 3, 4, 5, 6), battery_mv=7400, throttle=True, clock=time.monotonic):
+        """
+        SBS_Emulator: Emulated Serial Bus Servo Controller.
+        Parameters:
+            baud_rate: int
+                pace of the emulated link (only used when throttle is True)
+            servo_ids: iterable
+                ids of the servos on the bus; commands for other ids are ignored
+            battery_mv: int
+                voltage answered to 0x0F, in millivolts
+            throttle: bool
+                delay every byte by its wire time at baud_rate
+        """
+        self.baud_rate = baud_rate
+        self.throttle = throttle
+        self.battery_mv = battery_mv
+        self.clock = clock
+        self.servos = {sid: EmulatedServo() for sid in servo_ids}
+        self.lock = threading.Lock()
+        self.frames = []        # every frame received, in order (for tests)
+        self.drop_replies = 0   # number of upcoming responses to lose (for tests)
+        self.master = None
+        self.slave = None
+        self.port = None
+        self.thread = None
+        self.running = False
+
+    def start(self):
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="sbs-emulator", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+        for fd in (self.master, self.slave):
+            if fd is not None:
+                os.close(fd)
+        self.master = self.slave = self.thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def positions(self, servo_id):
+        """
+        return:
+            positions: list, current emulated position of each servo in servo_id
+        """
+        now = self.clock()
+        with self.lock:
+            return [self.servos[sid].position(now) for sid in servo_id]
+
+    def _pace(self, nbytes):
+        if self.throttle:
+            time.sleep(wire_time(nbytes, self.baud_rate))
+
+    def _run(self):
+        parser = FrameParser(REQUEST_FORMATS)
+        while self.running:
+            readable, _, _ = select.select([self.master], [], [], 0.05)
+            if not readable:
+                continue
+            try:
+                data = os.read(self.master, 256)
+            except OSError:
+                break
+            self._pace(len(data))
+            for frame in parser.feed(data):
+                response = self.handle(frame)
+                if response and self.drop_replies:
+                    self.drop_replies -= 1
+                    continue
+                if response:
+                    self._pace(len(response))
+                    os.write(self.master, response)
+
+    def handle(self, frame):
+        """
+        Description: Apply one request frame to the emulated servos.
+        return:
+            response: bytes, or None for commands without a response
+        """
+        now = self.clock()
+        cmd = frame[3]
+        with self.lock:
+            self.frames.append(frame)
+            if cmd == sbs_protocol.CMD_SERVO_MOVE:
+                n = frame[4]
+                duration = (frame[5] | (frame[6] << 8)) / 1000.0
+                for i in range(n):
+                    sid = frame[7+3*i]
+                    if sid in self.servos:
+                        self.servos[sid].move(frame[8+3*i] | (frame[9+3*i] << 8), duration, now)
+                return None
+            if cmd == sbs_protocol.CMD_MULT_SERVO_UNLOAD:
+                for sid in frame[5:5+frame[4]]:
+                    if sid in self.servos:
+                        self.servos[sid].unload(now)
+                return None
+            if cmd == sbs_protocol.CMD_GET_BATTERY_VOLTAGE:
+                mv = 0xffff & self.battery_mv
+                return bytes([0x55, 0x55, 0x04, cmd, 0xff & mv, 0xff & (mv >> 8)])
+            if cmd == sbs_protocol.CMD_MULT_SERVO_POS_READ:
+                ids = [sid for sid in frame[5:5+frame[4]] if sid in self.servos]
+                buf = bytearray([0x55, 0x55, 0xff & (len(ids)*3+3), cmd, len(ids)])
+                for sid in ids:
+                    p_val = 0xffff & self.servos[sid].position(now)
+                    buf.extend([sid, 0xff & p_val, 0xff & (p_val >> 8)])
+                return bytes(buf)
+        return None
+
+
+if __name__ == "__main__":
+    with SBS_Emulator() as emulator:
+        print(f"Serial bus servo controller emulated on {emulator.port} (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
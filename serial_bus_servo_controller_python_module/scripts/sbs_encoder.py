@@ -0,0 +1,108 @@
+# coding: utf-8
+"""
+sbs_encoder: Allocation-free encoding of servo move packets (command value 0x03).
+
+Packet layout (little endian, 7 + 3 * n bytes for n servos):
+    0x55 0x55 | length | 0x03 | n | time(2) | n * (servo id(1) | angle position(2))
+"""
+import struct
+
+import numpy as np
+
+from sbs_protocol import HEADER, CMD_SERVO_MOVE
+
+HEADER_SIZE = 7     # header(2) + length(1) + command value(1) + count(1) + time(2)
+SERVO_SIZE = 3      # servo id(1) + angle position(2)
+
+
+def packet_size(n):
+    """
+    return:
+        size: int, bytes of a move packet for n servos
+    """
+    return HEADER_SIZE + SERVO_SIZE * n
+
+
+class MoveEncoder:
+    def __init__(self, max_servos=6):
+        """
+        MoveEncoder: Encodes move packets into one reusable buffer with struct.pack_into.
+                     One struct.Struct is compiled per servo count and cached.
+                     The returned memoryview is only valid until the next call to encode, and the encoder
+                     must not be shared between threads (SBS_Worker gives the port a single writer).
+        Parameters:
+            max_servos: int
+                initial buffer capacity, grown on demand
+        """
+        self.buf = bytearray(packet_size(max_servos))
+        self.view = memoryview(self.buf)
+        self.structs = {}
+
+    def _struct(self, n):
+        s = self.structs.get(n)
+        if s is None:
+            s = self.structs[n] = struct.Struct('<2sBBBH' + 'BH' * n)
+        return s
+
+    def encode(self, servo_id, angle_position, time):
+        """
+        Description: Same packet as sbs_protocol.encode_servo_move, written into the reused buffer.
+        Parameters: see SBS_Controller.cmd_servo_move
+        return:
+            packet: memoryview into the encoder's buffer
+        """
+        n = len(servo_id)
+        size = packet_size(n)
+        if size > len(self.buf):
+            self.buf = bytearray(size)
+            self.view = memoryview(self.buf)
+        values = [0] * (2 * n)
+        values[0::2] = [0xff & sid for sid in servo_id]
+        values[1::2] = [0xffff & int(pos) for pos in angle_position]
+        self._struct(n).pack_into(self.buf, 0, HEADER, 3 * n + 5, CMD_SERVO_MOVE, n, 0xffff & time, *values)
+        return self.view[:size]
+
+
+def _trajectory_dtype(n):
+    return np.dtype([
+        ('header', 'u1', (2,)),
+        ('length', 'u1'),
+        ('cmd', 'u1'),
+        ('count', 'u1'),
+        ('time', '<u2'),
+        ('servo', [('id', 'u1'), ('pos', '<u2')], (n,)),
+    ])
+
+
+def encode_trajectory(servo_id, waypoints, time, out=None):
+    """
+    Description: Encode a whole trajectory, one move packet per waypoint, into one contiguous buffer.
+                 Packets are back to back, packet i starts at i * packet_size(len(servo_id)).
+    Parameters:
+        servo_id: list
+            e.g. servo_id = [6, 5, 4, 3, 2, 1]
+        waypoints: array-like, shape (N, len(servo_id))
+            angle positions of every servo at every waypoint
+        time: int or array-like of shape (N,) (ms)
+            move time of each packet
+        out: bytearray, optional
+            reused if it is at least N * packet_size bytes long
+    return:
+        buf: bytearray (out if given) holding the N packets
+    """
+    waypoints = np.asarray(waypoints)
+    N, n = waypoints.shape
+    if n != len(servo_id):
+        raise ValueError(f"waypoints have {n} columns for {len(servo_id)} servos")
+    size = N * packet_size(n)
+    if out is None or len(out) < size:
+        out = bytearray(size)
+    packets = np.frombuffer(out, dtype=_trajectory_dtype(n), count=N)
+    packets['header'] = 0x55
+    packets['length'] = 3 * n + 5
+    packets['cmd'] = CMD_SERVO_MOVE
+    packets['count'] = n
+    packets['time'] = np.asarray(time, dtype=np.int64) & 0xffff
+    packets['servo']['id'] = np.asarray(servo_id, dtype=np.int64) & 0xff
+    packets['servo']['pos'] = waypoints.astype(np.int64) & 0xffff
+    return out
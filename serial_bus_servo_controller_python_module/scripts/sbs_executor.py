@@ -0,0 +1,161 @@
+# coding: utf-8
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+class TrajectoryExecutor:
+    def __init__(self, controller, rate_hz=20.0, history=1000):
+        """
+        TrajectoryExecutor: Moves the end effector along straight lines at a fixed control rate.
+                            goto() returns at once; a background thread sends one move_end_effector
+                            per tick on a time.monotonic() deadline schedule, so the sleep time of a
+                            tick does not add up over a trajectory. A new goal preempts the current
+                            trajectory and starts from the last sent setpoint.
+        Parameters:
+            controller: SBS_Controller
+            rate_hz: float
+                control ticks per second, a period no shorter than controller.bus.move_time() (one 6 servo move)
+            history: int
+                number of recent tick lateness values kept in executor.lateness
+        """
+        self.controller = controller
+        self.period = 1.0 / rate_hz
+        self.lock = threading.Lock()
+        self.send_lock = threading.Lock()   # held while a tick sends its move, see cancel()
+        self.trajectory = None      # (start time, start pose, end pose, duration, wrist, grip)
+        self.setpoint = None        # last pose sent, (x, y, z, phi)
+        self.goals = 0              # goto() and cancel() calls, tells a tick whether its goal still stands
+        self.lateness = deque(maxlen=history)   # seconds each recent tick fired after its deadline
+        self.ticks = 0
+        self.overruns = 0           # ticks skipped because the previous one took longer than a period
+        self.preempted = 0          # trajectories replaced before they finished
+        self.errors = 0             # ticks whose move raised
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name="sbs-executor", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def goto(self, pose, duration, wrist, grip):
+        """
+        Description: Move to pose along a straight line in duration seconds, replacing the current goal.
+        Parameters:
+            pose: (x, y, z, phi): cm and deg; phi None lets move_end_effector choose the pitch
+            duration: float (s)
+            wrist: float (deg), wrist rotation
+            grip: int, gripper (servo 1) angle position
+        """
+        with self.lock:
+            if self.trajectory is not None:
+                self.preempted += 1
+                start = self.setpoint
+            else:
+                start = self.controller.achieved_pose()
+            if start is None:
+                start = pose    # nothing commanded yet: a single move of the whole duration
+            self.trajectory = (time.monotonic(), tuple(start), tuple(pose), max(duration, self.period), wrist, grip)
+            self.goals += 1
+
+    def cancel(self):
+        """
+        Description: Stop the current trajectory. Once cancel() returns, no tick of it sends a move anymore,
+                     so the caller can move the arm directly.
+        """
+        with self.send_lock, self.lock:
+            self.trajectory = None
+            self.goals += 1
+
+    def busy(self):
+        return self.trajectory is not None
+
+    def stats(self):
+        """
+        return:
+            dict: ticks sent, lateness (s) of the recent ticks (mean, p99, max), overruns, preempted trajectories
+                  and failed ticks
+        """
+        late = np.array(self.lateness)
+        return {
+            "ticks": self.ticks,
+            "late_mean": float(late.mean()) if len(late) else 0.0,
+            "late_p99": float(np.percentile(late, 99)) if len(late) else 0.0,
+            "late_max": float(late.max()) if len(late) else 0.0,
+            "overruns": self.overruns,
+            "preempted": self.preempted,
+            "errors": self.errors,
+        }
+
+    def _setpoint(self, now):
+        """
+        return:
+            (pose, wrist, grip, move time in s, goals) of the tick at now, None when idle
+        """
+        with self.lock:
+            if self.trajectory is None:
+                return None
+            goals = self.goals
+            t0, start, end, duration, wrist, grip = self.trajectory
+            s = min((now - t0) / duration, 1.0)
+            if start == end:
+                # Single move over the remaining time
+                move_time = duration - (now - t0)
+                self.trajectory = None
+                self.setpoint = end
+                return end, wrist, grip, max(move_time, self.period), goals
+            pose = tuple(a + (b - a) * s if a is not None and b is not None else b for a, b in zip(start, end))
+            if s >= 1.0:
+                self.trajectory = None
+            self.setpoint = pose
+            return pose, wrist, grip, self.period, goals
+
+    def _run(self):
+        deadline = time.monotonic()
+        while not self.stop_event.is_set():
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                self.stop_event.wait(delay)
+                continue
+            now = time.monotonic()
+            tick = self._setpoint(now)
+            if tick is not None:
+                self.lateness.append(now - deadline)
+                pose, wrist, grip, move_time, goals = tick
+                try:
+                    with self.send_lock:
+                        if self.goals == goals:     # not replaced or cancelled since _setpoint
+                            self.controller.move_end_effector(*pose, wrist, grip, int(move_time * 1000))
+                except ValueError:
+                    # Out of reach (move_end_effector raises ValueError): drop the goal, unless a goto() or cancel()
+                    # replaced it during the tick.
+                    with self.lock:
+                        if self.goals == goals:
+                            self.trajectory = None
+                            self.goals += 1
+                except Exception as e:
+                    # A failed tick (timeout, stopped worker, ...) must not end the thread: the next one retries,
+                    # the last pose of a trajectory included.
+                    self.errors += 1
+                    print(f"[SBS_EXECUTOR]: tick failed: {e}")
+                    with self.lock:
+                        if self.trajectory is None and self.goals == goals:
+                            self.trajectory = (time.monotonic(), pose, pose, self.period, wrist, grip)
+                self.ticks += 1
+            deadline += self.period
+            behind = time.monotonic() - deadline
+            if behind >= self.period:
+                # Fell behind by whole periods: skip those ticks rather than bunching them up.
+                missed = int(behind // self.period)
+                self.overruns += missed
+                deadline += missed * self.period
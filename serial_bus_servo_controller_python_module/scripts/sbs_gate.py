@@ -0,0 +1,156 @@
+# coding: utf-8
+import math
+import threading
+import time
+from collections import OrderedDict
+
+
+class InputGate:
+    def __init__(self, position_threshold=0.2, wrist_threshold=1.0, grip_threshold=5, max_rate_hz=10.0, max_sessions=16,
+                 on_deferred=None):
+        """
+        InputGate: Dead-band and rate limiter for incoming teleoperation targets.
+                   A target passes when it moved by at least one threshold since the last target that passed
+                   for its session, and at least 1 / max_rate_hz seconds after it. Dropped targets cost no IK,
+                   serial write or log line. Since the comparison is against the last target that passed,
+                   slow drifts still get through once they add up to a threshold.
+                   A target that only came too early is kept, the latest one per session, and handed to
+                   on_deferred once the interval is over, so the arm still reaches where the operator stopped.
+                   It is dropped when a newer target passes or falls back within the dead-band.
+                   Every session (client) keeps its last target and time stamp as plain floats; the least
+                   recently seen session is dropped beyond max_sessions.
+        Parameters:
+            position_threshold: float (cm), end effector distance
+                (one base servo position count moves the end effector about 0.12 cm at full reach)
+            wrist_threshold: float (deg)
+            grip_threshold: int, gripper (servo 1) angle positions
+            max_rate_hz: float, targets per second passed per session, None for no limit
+            max_sessions: int
+            on_deferred: function(session, x, y, z, wrist, grip, context), called from a timer thread,
+                         None to drop the targets that come too early
+        """
+        self.position_threshold = position_threshold
+        self.wrist_threshold = wrist_threshold
+        self.grip_threshold = grip_threshold
+        self.min_interval = 1.0 / max_rate_hz if max_rate_hz else 0.0
+        self.max_sessions = max_sessions
+        self.last = OrderedDict()   # session -> ((x, y, z, wrist, grip) of the last target passed, its time), least recently seen first
+        self.lock = threading.Lock()
+        self.passed = 0
+        self.dropped_deadband = 0   # targets within every threshold of the last one passed
+        self.dropped_rate = 0       # targets arriving faster than max_rate_hz and never sent
+        self.deferred = 0           # targets arriving faster than max_rate_hz, sent once the interval was over
+        self.on_deferred = on_deferred
+        self.pending = {}           # session -> (target, context) waiting for the interval to be over
+        self.timers = {}            # session -> threading.Timer of its pending target
+
+    def accept(self, session, x, y, z, wrist, grip, t=None, context=None):
+        """
+        Parameters:
+            session: hashable, e.g. the client connection's (host, port)
+            x, y, z: float (cm)
+            wrist: float (deg)
+            grip: int
+            t: float (s), time.monotonic() when None (it must be time.monotonic() based with on_deferred)
+            context: anything, handed back to on_deferred with the target
+        return:
+            True when the target should be commanded now
+        """
+        t = time.monotonic() if t is None else t
+        target = (float(x), float(y), float(z), float(wrist), float(grip))
+        with self.lock:
+            last = self.last.get(session)
+            if last is None:
+                if len(self.last) >= self.max_sessions:
+                    evicted, _ = self.last.popitem(last=False)
+                    self._drop_pending(evicted)
+            else:
+                (lx, ly, lz, lwrist, lgrip), stamp = last
+                if (math.hypot(target[0] - lx, target[1] - ly, target[2] - lz) < self.position_threshold
+                        and abs(target[3] - lwrist) < self.wrist_threshold and abs(target[4] - lgrip) < self.grip_threshold):
+                    self.last.move_to_end(session)
+                    self._drop_pending(session)
+                    self.dropped_deadband += 1
+                    return False
+                wait = stamp + self.min_interval - t
+                if wait > 0:
+                    self.last.move_to_end(session)
+                    if self.on_deferred is None:
+                        self.dropped_rate += 1
+                        return False
+                    if session in self.pending:
+                        self.dropped_rate += 1      # replaced by this one
+                    self.pending[session] = (target, context)
+                    if session not in self.timers:
+                        timer = self.timers[session] = threading.Timer(wait, self._release, (session,))
+                        timer.daemon = True
+                        timer.start()
+                    return False
+            self._drop_pending(session)
+            self.last[session] = (target, t)
+            self.last.move_to_end(session)
+            self.passed += 1
+            return True
+
+    def _drop_pending(self, session):
+        if self.pending.pop(session, None) is not None:
+            self.dropped_rate += 1
+        timer = self.timers.pop(session, None)
+        if timer is not None:
+            timer.cancel()
+
+    def _release(self, session):
+        with self.lock:
+            self.timers.pop(session, None)
+            entry = self.pending.pop(session, None)
+            if entry is None or session not in self.last:
+                return
+            target, context = entry
+            self.last[session] = (target, time.monotonic())
+            self.deferred += 1
+        x, y, z, wrist, grip = target
+        self.on_deferred(session, x, y, z, wrist, int(grip), context)
+
+    def is_current(self, session, x, y, z, wrist, grip):
+        """
+        Description: True while the target is still the last one passed or released for session.
+                     on_deferred runs on a timer thread, so a newer target of the session may pass and be
+                     commanded before it: check this under the lock that orders the commands.
+        """
+        with self.lock:
+            last = self.last.get(session)
+            if last is None:
+                return False
+            target, _ = last
+            return target[:4] == (float(x), float(y), float(z), float(wrist)) and int(target[4]) == int(grip)
+
+    def forget(self, session):
+        """
+        Description: Drop the last and pending targets of session, e.g. when its client disconnects.
+        """
+        with self.lock:
+            self._drop_pending(session)
+            self.last.pop(session, None)
+
+    def reset(self, session):
+        """
+        Description: Let the next target of session pass whatever it is.
+        """
+        with self.lock:
+            if session in self.last:
+                self.last[session] = ((math.nan,) * 5, -math.inf)     # NaN is within no threshold
+
+    def stats(self):
+        """
+        return:
+            dict: passed, deferred and dropped (dead-band, rate) targets, and the share dropped
+        """
+        dropped = self.dropped_deadband + self.dropped_rate
+        total = self.passed + self.deferred + dropped
+        return {
+            "passed": self.passed,
+            "dropped_deadband": self.dropped_deadband,
+            "dropped_rate": self.dropped_rate,
+            "deferred": self.deferred,
+            "drop_rate": dropped / total if total else 0.0,
+        }
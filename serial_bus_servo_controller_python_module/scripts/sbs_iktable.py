@@ -0,0 +1,279 @@
+# coding: utf-8
+"""
+sbs_iktable: Precomputed IK solutions with trilinear interpolation.
+
+IK of the arm only depends on the horizontal distance r = hypot(x, y), the height z and the
+pitch phi; the base angle is atan2(y, x). The table stores (theta_1, theta_2, theta_3) of
+sbs_kinematics.ik_batch on a regular (r, z, phi) grid, restricted to solutions within the
+calibration limits. A solve is then one 2x2x2 block read and a trilinear interpolation.
+Cells that touch an unreachable node, or where the solution varies too fast to interpolate
+(near the fully stretched arm), are flagged and solved exactly instead.
+
+The table is saved next to this file and memory-mapped at run time. load_or_build() rebuilds
+it whenever the link lengths, the calibration (both from arm.json, see sbs_arm.ArmModel) or the
+grid parameters differ from the saved ones:
+
+    python sbs_iktable.py               # build (if needed) and report accuracy against exact IK
+    arm = sbs_arm.ArmModel.load()
+    table = sbs_iktable.IKTable.load_or_build(arm=arm)     # arm.json as well when arm is None
+    controller = sbsc.SBS_Controller(dev, arm=arm, ik_table=table)
+"""
+import json
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+import sbs_kinematics
+import sbs_precomputed
+from sbs_calibration import Calibration
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ik_table")
+
+# A cell is only interpolated when the interpolated solution at its center is within this of exact IK (deg).
+MAX_CELL_ERROR = 0.5
+
+
+class IKTable:
+    def __init__(self, table, origin, resolution, meta=None):
+        """
+        IKTable: IK lookup table over (r, z, phi).
+        Parameters:
+            table: float32 ndarray, shape (nr, nz, nphi, 4) (may be memory-mapped)
+                [..., :3] theta_1, theta_2, theta_3 (deg) at every node,
+                [..., 3] 1.0 where the cell whose lowest corner is this node can be interpolated
+            origin: (r, z, phi) of node (0, 0, 0) (cm, cm, deg)
+            resolution: (dr, dz, dphi) node spacing (cm, cm, deg)
+            meta: dict, parameters the table was built with
+        """
+        self.table = table
+        self.shape = table.shape[:3]
+        self.origin = tuple(float(v) for v in origin)
+        self.resolution = tuple(float(v) for v in resolution)
+        self.meta = meta or {}
+
+    @staticmethod
+    def parameters(arm=None, resolution=0.5, phi_step=5.0, phi_range=(-90.0, 90.0)):
+        """
+        return:
+            dict of everything the table content depends on (compared by load_or_build)
+        """
+        return dict(sbs_precomputed.arm_parameters(sbs_precomputed.default_arm(arm)),
+                    resolution=resolution, phi_step=phi_step, phi_range=list(phi_range))
+
+    @classmethod
+    def build(cls, arm=None, resolution=0.5, phi_step=5.0, phi_range=(-90.0, 90.0)):
+        """
+        Description: Solve IK at every node of the grid enclosing the fully stretched arm.
+        Parameters:
+            arm: sbs_arm.ArmModel, links and joint limits (arm.json when None)
+            resolution: float (cm), r and z node spacing
+            phi_step: float (deg), pitch node spacing
+            phi_range: (min, max) pitch covered (deg)
+        """
+        arm = sbs_precomputed.default_arm(arm)
+        calibration = arm.calibration
+        l1, l2, l3 = arm.links
+        extent = arm.extent
+        r_axis = resolution * np.arange(int(np.ceil(extent / resolution)) + 1)
+        z_axis = -extent + resolution * np.arange(int(np.ceil(2 * extent / resolution)) + 1)
+        phi_axis = phi_range[0] + phi_step * np.arange(int(round((phi_range[1] - phi_range[0]) / phi_step)) + 1)
+        R, Z, P = np.meshgrid(r_axis, z_axis, phi_axis, indexing="ij")
+        targets = np.stack([R.ravel(), np.zeros(R.size), Z.ravel(), P.ravel()], axis=1)
+        angles, valid = sbs_kinematics.ik_batch(targets, l1, l2, l3)
+        angles = angles[:, 1:]
+        within = np.all((angles >= calibration.angle_min[1:4]) & (angles <= calibration.angle_max[1:4]), axis=1)
+        node_ok = (valid & within).reshape(R.shape)
+        angles = angles.reshape(R.shape + (3,))
+
+        # Cell (i, j, k) spans nodes i..i+1, j..j+1, k..k+1.
+        corners = [angles[i:angles.shape[0] - 1 + i, j:angles.shape[1] - 1 + j, k:angles.shape[2] - 1 + k]
+                   for i in (0, 1) for j in (0, 1) for k in (0, 1)]
+        corners_ok = [node_ok[i:node_ok.shape[0] - 1 + i, j:node_ok.shape[1] - 1 + j, k:node_ok.shape[2] - 1 + k]
+                      for i in (0, 1) for j in (0, 1) for k in (0, 1)]
+        # Trilinear interpolation is least accurate at the cell center, where it is the corner mean.
+        centers = np.stack([R[:-1, :-1, :-1].ravel() + resolution / 2, np.zeros(corners[0][..., 0].size),
+                            Z[:-1, :-1, :-1].ravel() + resolution / 2, P[:-1, :-1, :-1].ravel() + phi_step / 2], axis=1)
+        center_angles, center_valid = sbs_kinematics.ik_batch(centers, l1, l2, l3)
+        center_error = np.abs(np.mean(corners, axis=0).reshape(-1, 3) - center_angles[:, 1:]).max(axis=1)
+        cell_ok = np.all(corners_ok, axis=0) & (center_valid & (center_error <= MAX_CELL_ERROR)).reshape(corners_ok[0].shape)
+
+        table = np.zeros(R.shape + (4,), dtype=np.float32)
+        table[..., :3] = np.where(node_ok[..., None], angles, 0.0)
+        table[:-1, :-1, :-1, 3] = cell_ok
+        meta = cls.parameters(arm, resolution, phi_step, phi_range)
+        meta["covered_cells"] = int(cell_ok.sum())
+        return cls(table, (r_axis[0], z_axis[0], phi_axis[0]), (resolution, resolution, phi_step), meta)
+
+    def built_for(self, arm):
+        """
+        return:
+            True when the table was built with the link lengths and calibration of arm
+        """
+        expected = json.loads(json.dumps(sbs_precomputed.arm_parameters(arm)))
+        return all(self.meta.get(k) == v for k, v in expected.items())
+
+    def save(self, path=DEFAULT_PATH):
+        sbs_precomputed.save(path, self.table,
+                             dict(self.meta, origin=self.origin, spacing=self.resolution, shape=list(self.shape)))
+
+    @classmethod
+    def load(cls, path=DEFAULT_PATH):
+        """
+        Description: Load a saved table; the node array is memory-mapped, not read.
+        """
+        table, meta = sbs_precomputed.load(path)
+        return cls(table, meta.pop("origin"), meta.pop("spacing"), meta)
+
+    @classmethod
+    def load_or_build(cls, path=DEFAULT_PATH, arm=None, **parameters):
+        """
+        Description: Load the saved table if it was built with the same parameters (see parameters()),
+                     otherwise build it, save it and return it.
+        Parameters:
+            arm: sbs_arm.ArmModel (arm.json when None)
+            parameters: resolution, phi_step, phi_range of build()
+        """
+        return sbs_precomputed.load_or_build(cls, path, dict(parameters, arm=sbs_precomputed.default_arm(arm)))
+
+    def solve(self, x3, y3, z3, phi):
+        """
+        Description: Interpolated IK of one target, a drop-in for sbs_kinematics.ik_scalar.
+        Parameters:
+            x3, y3, z3: float (cm)
+            phi: float (rad), end effector pitch
+        return:
+            (theta_base, theta_1, theta_2, theta_3) in rad, or None when the target is not covered
+            by the table (out of reach, out of the joint limits, or near a singularity)
+        """
+        r0, z0, p0 = self.origin
+        dr, dz, dp = self.resolution
+        fr = math.hypot(x3, y3) / dr - r0 / dr
+        fz = (z3 - z0) / dz
+        fp = (math.degrees(phi) - p0) / dp
+        i, j, k = int(fr), int(fz), int(fp)
+        nr, nz, nphi = self.shape
+        if not (0 <= fr and 0 <= fz and 0 <= fp and i < nr - 1 and j < nz - 1 and k < nphi - 1):
+            return None
+        block = self.table[i:i + 2, j:j + 2, k:k + 2].tolist()
+        if not block[0][0][0][3]:
+            return None
+        u, v, w = fr - i, fz - j, fp - k
+        (a00, a01), (a10, a11) = block[0]
+        (b00, b01), (b10, b11) = block[1]
+        angles = [math.atan2(y3, x3)]
+        for n in range(3):
+            c00 = a00[n] + (a01[n] - a00[n]) * w
+            c01 = a10[n] + (a11[n] - a10[n]) * w
+            c10 = b00[n] + (b01[n] - b00[n]) * w
+            c11 = b10[n] + (b11[n] - b10[n]) * w
+            c0 = c00 + (c01 - c00) * v
+            c1 = c10 + (c11 - c10) * v
+            angles.append(math.radians(c0 + (c1 - c0) * u))
+        return tuple(angles)
+
+    def solve_batch(self, targets):
+        """
+        Description: Interpolated IK of many targets, a drop-in for sbs_kinematics.ik_batch.
+        Parameters:
+            targets: array-like, shape (N, 4), rows of (x, y, z, phi) (cm, deg)
+        return:
+            angles: ndarray, shape (N, 4), (theta_base, theta_1, theta_2, theta_3) in deg, NaN where not covered
+            covered: bool ndarray, shape (N,)
+        """
+        targets = np.asarray(targets, dtype=float)
+        f = np.stack([np.hypot(targets[:, 0], targets[:, 1]), targets[:, 2], targets[:, 3]], axis=1)
+        f = (f - self.origin) / self.resolution
+        idx = np.floor(f).astype(int)
+        inside = np.all((f >= 0) & (idx < np.array(self.shape) - 1), axis=1)
+        idx = np.where(inside[:, None], idx, 0)
+        frac = f - idx
+        i, j, k = idx.T
+        covered = inside & (self.table[i, j, k, 3] > 0)
+
+        result = np.zeros((len(targets), 3))
+        for di in (0, 1):
+            wi = frac[:, 0] if di else 1 - frac[:, 0]
+            for dj in (0, 1):
+                wj = frac[:, 1] if dj else 1 - frac[:, 1]
+                for dk in (0, 1):
+                    wk = frac[:, 2] if dk else 1 - frac[:, 2]
+                    result += (wi * wj * wk)[:, None] * self.table[i + di, j + dj, k + dk, :3]
+        angles = np.empty((len(targets), 4))
+        angles[:, 0] = np.rad2deg(np.arctan2(targets[:, 1], targets[:, 0]))
+        angles[:, 1:] = result
+        angles[~covered] = np.nan
+        return angles, covered
+
+    def accuracy(self, samples=200_000, seed=0):
+        """
+        Description: Compare solve_batch with exact IK on random targets covered by the table.
+        return:
+            dict: coverage of the sampled targets reachable within the joint limits, joint angle error (deg) and
+                  end effector position error through forward kinematics (cm)
+        """
+        l1, l2, l3 = self.meta["links"]
+        extent = l1 + l2 + l3
+        lo, hi = self.meta.get("phi_range", (-90.0, 90.0))
+        rng = np.random.default_rng(seed)
+        targets = np.empty((samples, 4))
+        targets[:, :3] = rng.uniform(-extent, extent, size=(samples, 3))
+        targets[:, 3] = rng.uniform(lo, hi, size=samples)
+
+        exact, valid = sbs_kinematics.ik_batch(targets, l1, l2, l3)
+        servo_ranges = self.meta.get("servo_ranges")
+        if servo_ranges:
+            calibration = Calibration({int(k): v for k, v in servo_ranges.items()})
+            valid &= np.all((exact >= calibration.angle_min[:4]) & (exact <= calibration.angle_max[:4]), axis=1)
+        angles, covered = self.solve_batch(targets)
+        covered &= valid
+        angle_error = np.abs(angles[covered] - exact[covered]).max(axis=1)
+        position_error = np.linalg.norm(sbs_kinematics.fk_batch(angles[covered], l1, l2, l3)[:, :3]
+                                        - targets[covered, :3], axis=1)
+        return {
+            "samples": samples,
+            "covered": int(covered.sum()),
+            "coverage_of_reachable": covered.sum() / max(valid.sum(), 1),
+            "angle_error_median": float(np.median(angle_error)),
+            "angle_error_p99": float(np.percentile(angle_error, 99)),
+            "angle_error_max": float(angle_error.max()),
+            "position_error_median": float(np.median(position_error)),
+            "position_error_p99": float(np.percentile(position_error, 99)),
+            "position_error_max": float(position_error.max()),
+        }
+
+
+if __name__ == "__main__":
+    from sbs_arm import ArmModel
+    arm = ArmModel.load()
+    resolution = float(sys.argv[1]) if len(sys.argv) > 1 else 0.5
+    t0 = time.perf_counter()
+    table = IKTable.load_or_build(arm=arm, resolution=resolution)
+    print(f"IK table {table.shape} at {resolution} cm / {table.meta['phi_step']} deg: "
+          f"{table.meta['covered_cells']} interpolable cells, ready in {time.perf_counter() - t0:.1f} s ({DEFAULT_PATH}.npy)")
+    report = table.accuracy()
+    print(f"Covered {report['covered']} of {report['samples']} random targets "
+          f"({report['coverage_of_reachable']:.1%} of the reachable ones)")
+    print(f"Joint angle error (deg):        median {report['angle_error_median']:.4f}  p99 {report['angle_error_p99']:.4f}  max {report['angle_error_max']:.4f}")
+    print(f"End effector position error (cm): median {report['position_error_median']:.4f}  p99 {report['position_error_p99']:.4f}  max {report['position_error_max']:.4f}")
+
+    # Per target cost against exact IK, on a covered target and on a batch of them.
+    x, y, z = 15.0, 3.0, 8.0
+    n = 100_000
+    t0 = time.perf_counter()
+    for _ in range(n):
+        table.solve(x, y, z, 0.0)
+    t1 = time.perf_counter()
+    for _ in range(n):
+        arm.ik(x, y, z, 0.0)
+    t2 = time.perf_counter()
+    print(f"Single target: table {(t1 - t0) / n * 1e6:.2f} us, exact IK {(t2 - t1) / n * 1e6:.2f} us")
+    targets = np.tile([x, y, z, 0.0], (n, 1))
+    t0 = time.perf_counter()
+    table.solve_batch(targets)
+    t1 = time.perf_counter()
+    arm.ik_batch(targets)
+    t2 = time.perf_counter()
+    print(f"Batch of {n}: table {(t1 - t0) / n * 1e9:.0f} ns/target, exact IK {(t2 - t1) / n * 1e9:.0f} ns/target")
@@ -0,0 +1,285 @@
+# coding: utf-8
+import math
+import time
+
+import numpy as np
+
+# Every function takes the link lengths l1, l2, l3 in cm: shoulder (servo 5) to elbow (servo 4),
+# elbow to wrist (servo 3) and wrist to end effector. They come from arm.json (sbs_arm.ArmModel).
+
+# IK solution branches, by index: (base turned away from the target, elbow sign).
+# Turned away, the arm reaches back over the shoulder (theta_1 > 90 deg) with the base at atan2(y, x) + 180 deg.
+# Branch 0 (base toward the target, s2 < 0) is the solution move_end_effector has always used.
+BRANCHES = ((False, -1.0), (False, 1.0), (True, -1.0), (True, 1.0))
+
+# Pitch range (deg) and coarse pass candidates of ik_free_pitch.
+PITCH_RANGE = (-90.0, 90.0)
+PITCH_STEPS = 37
+
+
+def ik_batch(targets, l1, l2, l3, branch=0):
+    """
+    Description: Inverse kinematics of many end effector targets at once.
+                 Same solution as ik_scalar (by default the elbow branch s2 < 0).
+    Parameters:
+        targets: array-like, shape (N, 4)
+            rows of (x, y, z, phi): end effector position (cm) and pitch angle phi (deg)
+        branch: int, index into BRANCHES
+    return:
+        angles: ndarray, shape (N, 4)
+            rows of (theta_base, theta_1, theta_2, theta_3) in deg, for cmd_move_with_angle
+        valid: bool ndarray, shape (N,)
+            False where the target is out of reach; the angles of such rows are those of the
+            clipped (nearest fully stretched or folded) elbow configuration
+    """
+    targets = np.asarray(targets, dtype=float)
+    x3, y3, z3, p = targets[:, 0], targets[:, 1], targets[:, 2], targets[:, 3]
+
+    flip, elbow = BRANCHES[branch]
+    phi = np.deg2rad(p)
+    # Horizontal distance to the target on the XY plane
+    r3 = np.sqrt(x3**2 + y3**2)
+    theta_base = np.arctan2(y3, x3)
+    if flip:
+        # Same target and pitch seen from the base turned around: behind it, pitch mirrored.
+        r3 = -r3
+        theta_base = theta_base + np.pi
+        phi = np.pi - phi
+
+    # Wrist position in the arm plane
+    r2 = r3 - l3*np.cos(phi)
+    z2 = z3 - l3*np.sin(phi)
+    d2 = r2**2 + z2**2
+
+    c2 = (d2 - l1**2 - l2**2)/(2*l1*l2)
+    valid = (np.abs(c2) <= 1.0) & (d2 > 0)
+    c2 = np.clip(c2, -1.0, 1.0)
+    s2 = elbow*np.sqrt(1 - c2**2)
+    theta_2 = np.arctan2(s2, c2)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        s1 = ((l1 + l2*c2)*z2 - l2*s2*r2)/d2
+        c1 = ((l1 + l2*c2)*r2 + l2*s2*z2)/d2
+    theta_1 = np.arctan2(s1, c1)
+
+    theta_3 = phi - theta_1 - theta_2
+
+    angles = np.rad2deg(np.stack([theta_base, theta_1, theta_2, theta_3], axis=1))
+    valid &= np.all(np.isfinite(angles), axis=1)
+    return angles, valid
+
+
+def fk_batch(angles, l1, l2, l3):
+    """
+    Description: Forward kinematics of many joint vectors at once (inverse of ik_batch).
+    Parameters:
+        angles: array-like, shape (N, 4) or (N, 5)
+            rows of (theta_base, theta_1, theta_2, theta_3[, wrist]) in deg; the wrist rotation
+            does not move the end effector and is ignored
+    return:
+        poses: ndarray, shape (N, 4)
+            rows of (x, y, z, phi): end effector position (cm) and pitch angle (deg), the pitch taken
+            relative to the horizontal direction from the base axis to the end effector, in [-180, 180)
+    """
+    angles = np.deg2rad(np.asarray(angles, dtype=float)[:, :4])
+    theta_base, theta_1, theta_2, theta_3 = angles.T
+    a12 = theta_1 + theta_2
+    phi = a12 + theta_3
+    r = l1*np.cos(theta_1) + l2*np.cos(a12) + l3*np.cos(phi)
+    z = l1*np.sin(theta_1) + l2*np.sin(a12) + l3*np.sin(phi)
+    # Reaching back over the shoulder (r < 0) mirrors the pitch, see BRANCHES.
+    phi = np.where(r < 0, np.pi - phi, phi)
+    phi = (phi + np.pi) % (2*np.pi) - np.pi
+    return np.stack([r*np.cos(theta_base), r*np.sin(theta_base), z, np.rad2deg(phi)], axis=1)
+
+
+def jacobian(theta_base, theta_1, theta_2, theta_3, l1, l2, l3):
+    """
+    Description: Analytic Jacobian of the end effector pose (x, y, z, phi) of fk_batch with respect to
+                 the joint angles; phi is the pitch in the arm plane (a12 + theta_3).
+    Parameters:
+        theta_base, theta_1, theta_2, theta_3: float (rad)
+    return:
+        J: ndarray, shape (4, 4)
+            J[i, j] = d pose_i / d theta_j, rows x, y, z (cm/rad) and phi (rad/rad)
+    """
+    a12 = theta_1 + theta_2
+    phi = a12 + theta_3
+    # d(r, z)/d(theta_1, theta_2, theta_3) in the arm plane
+    dr3, dz3 = -l3*math.sin(phi), l3*math.cos(phi)
+    dr2, dz2 = dr3 - l2*math.sin(a12), dz3 + l2*math.cos(a12)
+    dr1, dz1 = dr2 - l1*math.sin(theta_1), dz2 + l1*math.cos(theta_1)
+    r = dz1     # l1*cos(theta_1) + l2*cos(a12) + l3*cos(phi)
+    c, s = math.cos(theta_base), math.sin(theta_base)
+    return np.array([
+        [-r*s, c*dr1, c*dr2, c*dr3],
+        [r*c, s*dr1, s*dr2, s*dr3],
+        [0.0, dz1, dz2, dz3],
+        [0.0, 1.0, 1.0, 1.0],
+    ])
+
+
+def ik_scalar(x3, y3, z3, phi, l1, l2, l3, branch=0):
+    """
+    Description: Inverse kinematics of one target with the math module (fast path for single targets).
+                 Same solution as ik_batch, but works in radians end to end and avoids NumPy scalar overhead.
+    Parameters:
+        x3, y3, z3: float (cm)
+        phi: float (rad), end effector pitch
+        branch: int, index into BRANCHES
+    return:
+        theta_base, theta_1, theta_2, theta_3: float (rad)
+        valid: bool, False when the target is out of reach (angles are those of the clipped elbow)
+    """
+    flip, elbow = BRANCHES[branch]
+    r3 = math.hypot(x3, y3)
+    theta_base = math.atan2(y3, x3)
+    if flip:
+        r3 = -r3
+        theta_base += math.pi
+        phi = math.pi - phi
+
+    r2 = r3 - l3*math.cos(phi)
+    z2 = z3 - l3*math.sin(phi)
+    d2 = r2*r2 + z2*z2
+
+    c2 = (d2 - l1*l1 - l2*l2)/(2*l1*l2)
+    valid = -1.0 <= c2 <= 1.0 and d2 > 0
+    c2 = min(max(c2, -1.0), 1.0)
+    s2 = elbow*math.sqrt(1 - c2*c2)
+    theta_2 = math.atan2(s2, c2)
+
+    # s1 and c1 share the positive denominator d2, which atan2 does not need.
+    k1 = l1 + l2*c2
+    k2 = l2*s2
+    theta_1 = math.atan2(k1*z2 - k2*r2, k1*r2 + k2*z2)
+
+    theta_3 = phi - theta_1 - theta_2
+    return theta_base, theta_1, theta_2, theta_3, valid
+
+
+def ik_nearest(x3, y3, z3, phi, l1, l2, l3, previous=None, limits=None):
+    """
+    Description: Inverse kinematics over every branch of BRANCHES, with every joint angle free to
+                 wrap by 360 deg, keeping the solution that is
+                     1. reachable,
+                     2. the least outside the joint limits,
+                     3. the closest to previous (largest single joint travel, which sets the move time).
+                 Ties go to the lower branch index, so without previous the result is ik_scalar's
+                 whenever that one is within the limits.
+    Parameters:
+        x3, y3, z3: float (cm)
+        phi: float (rad), end effector pitch
+        previous: (theta_base, theta_1, theta_2, theta_3) in rad, e.g. the currently commanded joints, or None
+        limits: sequence of 4 (min, max) in rad, e.g. Calibration.radian_ranges, or None
+    return:
+        theta_base, theta_1, theta_2, theta_3: float (rad)
+        valid: bool, False when the target is out of reach
+        branch: int, index into BRANCHES of the solution
+    """
+    best = best_cost = None
+    for branch in range(len(BRANCHES)):
+        *angles, valid = ik_scalar(x3, y3, z3, phi, l1, l2, l3, branch)
+        violation = 0.0
+        travel = 0.0
+        for n, angle in enumerate(angles):
+            lo, hi = limits[n][:2] if limits else (-math.inf, math.inf)
+            choice = choice_cost = None
+            for candidate in (angle, angle - 2*math.pi, angle + 2*math.pi):
+                cost = (max(lo - candidate, 0.0) + max(candidate - hi, 0.0),
+                        abs(candidate - previous[n]) if previous is not None else 0.0)
+                if choice_cost is None or cost < choice_cost:
+                    choice, choice_cost = candidate, cost
+            angles[n] = choice
+            violation += choice_cost[0]
+            travel = max(travel, choice_cost[1])
+        cost = (not valid, violation, travel)
+        if best_cost is None or cost < best_cost:
+            best, best_cost = (*angles, valid, branch), cost
+    return best
+
+
+def _joints_within(angles, angle_min, angle_max, previous):
+    """
+    return:
+        angles: each joint turned by -360, 0 or +360 deg to be within its limits, the turn closest to previous first
+        travel: per joint distance to previous (deg, 0 without previous), inf where no turn is within the limits
+    """
+    turns = angles[None] + np.array([0.0, -360.0, 360.0])[:, None, None]
+    inside = (turns >= angle_min) & (turns <= angle_max)
+    distance = np.abs(turns - previous) if previous is not None else np.zeros_like(turns)
+    distance = np.where(inside, distance, np.inf)
+    best = np.argmin(distance, axis=0)
+    return np.take_along_axis(turns, best[None], 0)[0], np.take_along_axis(distance, best[None], 0)[0]
+
+
+def ik_free_pitch(x3, y3, z3, angle_min, angle_max, l1, l2, l3, previous=None, preferred=0.0, pitch_range=PITCH_RANGE,
+                  steps=PITCH_STEPS, budget=0.002, pitch_weight=0.05):
+    """
+    Description: Inverse kinematics with the end effector pitch left free.
+                 Every pitch candidate is solved on every branch of BRANCHES at once (ik_batch); among the
+                 solutions with every joint within its limits, the one with the least joint travel from
+                 previous (largest single joint) wins, pitches away from preferred costing pitch_weight
+                 deg of travel per deg. A coarse pass over pitch_range, one branch after the other, then
+                 passes refining the best pitch, each run only while it fits in budget (the first branch of
+                 the coarse pass always runs): the best pitch found so far is returned when time is up.
+    Parameters:
+        x3, y3, z3: float (cm)
+        angle_min, angle_max: array-like, shape (4,)
+            joint limits (deg), e.g. Calibration.angle_min[:4], Calibration.angle_max[:4]
+        previous: array-like, shape (4,), currently commanded joints (deg), or None
+        preferred: float (deg), pitch to hold when it costs nothing
+        pitch_range: (min, max) pitch searched (deg)
+        steps: int, pitch candidates of the coarse pass
+        budget: float (s), per call time budget
+    return:
+        angles: (theta_base, theta_1, theta_2, theta_3) tuple of float (deg)
+        phi: float (deg)
+        valid: bool, False when no pitch in pitch_range reaches the target within the joint limits, or none
+               was found within budget (angles and phi are then those of ik_nearest at the preferred pitch)
+        branch: int, index into BRANCHES
+    """
+    start = time.perf_counter()
+    angle_min = np.asarray(angle_min, dtype=float)
+    angle_max = np.asarray(angle_max, dtype=float)
+    if previous is not None:
+        previous = np.asarray(previous, dtype=float)
+
+    def search(phis):
+        targets = np.empty((len(phis), 4))
+        targets[:, :3] = x3, y3, z3
+        targets[:, 3] = phis
+        best = None
+        branch_time = 0.0
+        for branch in range(len(BRANCHES)):
+            t0 = time.perf_counter()
+            if branch and t0 - start + branch_time > budget:
+                break
+            angles, valid = ik_batch(targets, l1, l2, l3, branch)
+            angles, travel = _joints_within(angles, angle_min, angle_max, previous)
+            cost = np.where(valid, travel.max(axis=1), np.inf) + pitch_weight*np.abs(phis - preferred)
+            n = int(np.argmin(cost))
+            if np.isfinite(cost[n]) and (best is None or cost[n] < best[0]):
+                best = (float(cost[n]), tuple(angles[n].tolist()), float(phis[n]), branch)
+            branch_time = time.perf_counter() - t0
+        return best
+
+    lo, hi = pitch_range
+    step = (hi - lo) / (steps - 1)
+    best = search(np.linspace(lo, hi, steps))
+    pass_time = time.perf_counter() - start
+    if best is None:
+        limits = list(zip(np.deg2rad(angle_min).tolist(), np.deg2rad(angle_max).tolist()))
+        *angles, _, branch = ik_nearest(x3, y3, z3, math.radians(preferred), l1, l2, l3,
+                                        None if previous is None else np.deg2rad(previous).tolist(), limits)
+        return tuple(math.degrees(a) for a in angles), preferred, False, branch
+    while time.perf_counter() - start + pass_time <= budget and step > 0.01:
+        phis = np.clip(best[2] + step*np.linspace(-1.0, 1.0, 9), lo, hi)
+        step /= 4
+        t0 = time.perf_counter()
+        refined = search(phis)
+        pass_time = time.perf_counter() - t0
+        if refined is not None and refined[0] < best[0]:
+            best = refined
+    _, angles, phi, branch = best
+    return angles, phi, True, branch
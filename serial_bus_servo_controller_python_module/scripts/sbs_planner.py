@@ -0,0 +1,50 @@
+# coding: utf-8
+import math
+
+# Servo shaft rotation per position count (0 - 1000 spans 240 deg).
+DEG_PER_COUNT = 0.24
+
+
+class MovePlanner:
+    def __init__(self, servo_limits, min_duration=20, first_duration=1000):
+        """
+        MovePlanner: Shortest move duration the servo speed and acceleration limits allow.
+                     Every servo of a move runs a trapezoidal (or, for short moves, triangular)
+                     speed profile; the move takes as long as its slowest servo.
+        Parameters:
+            servo_limits: dict
+                servo id -> {"max_speed": deg/s, "max_accel": deg/s^2}, e.g. ArmModel.servo_limits
+            min_duration: int (ms), shortest duration planned
+            first_duration: int (ms), duration when a servo's current position is unknown
+        """
+        self.servo_limits = servo_limits
+        self.min_duration = min_duration
+        self.first_duration = first_duration
+
+    @staticmethod
+    def profile_time(distance, max_speed, max_accel):
+        """
+        return:
+            time: float (s) to rotate distance (deg) from rest to rest
+        """
+        if distance * max_accel >= max_speed**2:
+            return distance / max_speed + max_speed / max_accel    # accelerate, cruise, decelerate
+        return 2 * math.sqrt(distance / max_accel)                  # accelerate, decelerate
+
+    def duration(self, servo_id, positions, current):
+        """
+        Parameters:
+            servo_id: list of servo ids of the move
+            positions: list of target positions, same order
+            current: dict, servo id -> current (last commanded) position
+        return:
+            duration: int (ms)
+        """
+        slowest = 0.0
+        for sid, position in zip(servo_id, positions):
+            start = current.get(sid)
+            if start is None:
+                return self.first_duration
+            limits = self.servo_limits[sid]
+            slowest = max(slowest, self.profile_time(abs(position - start) * DEG_PER_COUNT, limits["max_speed"], limits["max_accel"]))
+        return max(self.min_duration, int(math.ceil(slowest * 1000)))
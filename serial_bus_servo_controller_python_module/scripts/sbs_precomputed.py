@@ -0,0 +1,77 @@
+# coding: utf-8
+"""
+sbs_precomputed: Saving, loading and invalidation of arrays precomputed from the arm model
+(sbs_reach.ReachGrid, sbs_iktable.IKTable).
+
+Each one is saved as <path>.npy (the array, memory-mapped when loaded) and <path>.json (the
+parameters it was built with, see its parameters()). A saved one is only used while its parameters
+match the ones asked for, so it is rebuilt when arm.json changes.
+"""
+import json
+
+import numpy as np
+
+
+def default_arm(arm):
+    """
+    return:
+        arm, or the model of arm.json when arm is None
+    """
+    if arm is None:
+        from sbs_arm import ArmModel   # sbs_arm imports sbs_iktable, which imports this module
+        arm = ArmModel.load()
+    return arm
+
+
+def arm_parameters(arm):
+    """
+    return:
+        dict of the arm model a precomputed array depends on (link lengths and calibration)
+    """
+    return {
+        "links": list(arm.links),
+        "servo_ranges": {str(k): v for k, v in arm.calibration.servo_ranges.items()},
+    }
+
+
+def save(path, array, meta):
+    np.save(path + ".npy", np.asarray(array))
+    with open(path + ".json", "w") as f:
+        json.dump(meta, f, indent=1)
+
+
+def load(path):
+    """
+    return:
+        array: memory-mapped ndarray, meta: dict
+    """
+    with open(path + ".json") as f:
+        meta = json.load(f)
+    return np.load(path + ".npy", mmap_mode="r"), meta
+
+
+def load_current(cls, path, parameters):
+    """
+    Description: cls.load(path) if it was built with cls.parameters(**parameters).
+    return:
+        the loaded object, None when it is missing, unreadable or was built with other parameters
+    """
+    expected = json.loads(json.dumps(cls.parameters(**parameters)))   # same types as read back from JSON
+    try:
+        loaded = cls.load(path)
+    except (FileNotFoundError, ValueError, KeyError):
+        return None
+    if all(loaded.meta.get(k) == v for k, v in expected.items()):
+        return loaded
+    return None
+
+
+def load_or_build(cls, path, parameters):
+    """
+    Description: load_current(), otherwise cls.build(**parameters), saved to path.
+    """
+    loaded = load_current(cls, path, parameters)
+    if loaded is None:
+        loaded = cls.build(**parameters)
+        loaded.save(path)
+    return loaded
@@ -0,0 +1,142 @@
+# coding: utf-8
+import math
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+def tracking_gains(tracking_index):
+    """
+    Description: Steady state Kalman gains of an alpha-beta filter (Kalata), for a constant velocity target
+                 with white acceleration noise.
+    Parameters:
+        tracking_index: float
+            process noise (cm/s^2) * dt^2 / measurement noise (cm); larger follows faster, smaller smooths more
+    return:
+        alpha, beta: float
+    """
+    lam = tracking_index
+    r = (4 + lam - math.sqrt(8 * lam + lam**2)) / 4
+    alpha = 1 - r**2
+    beta = 2 * (2 - alpha) - 4 * math.sqrt(1 - alpha)
+    return alpha, beta
+
+
+class AlphaBetaPredictor:
+    def __init__(self, dims=3, alpha=0.5, beta=0.1, lead=0.3, max_speed=50.0, reset_after=5.0, max_sessions=16):
+        """
+        AlphaBetaPredictor: Estimates the velocity of a streamed target and predicts where it will be lead seconds
+                            after the sample, e.g. when the arm gets there (network latency + move time).
+                            Every session (VR client) has one row of position, velocity and time stamp in
+                            fixed (max_sessions, dims) arrays; the least recently updated session is dropped
+                            when a new one needs a row.
+        Parameters:
+            dims: int, values per sample, e.g. 3 for x, y, z
+            alpha, beta: float
+                position and velocity gains, see tracking_gains() for values from the noise levels
+            lead: float (s), prediction horizon of update()
+            max_speed: float (units/s), estimated speeds are limited to it so a glitch does not throw the arm
+            reset_after: float (s)
+                a session whose samples are further apart restarts from its next sample at rest
+            max_sessions: int
+        """
+        self.dims = dims
+        self.alpha = alpha
+        self.beta = beta
+        self.lead = lead
+        self.max_speed = max_speed
+        self.reset_after = reset_after
+        self.position = np.zeros((max_sessions, dims))
+        self.velocity = np.zeros((max_sessions, dims))
+        self.stamp = np.zeros(max_sessions)
+        self.rows = OrderedDict()   # session -> row, least recently updated first
+        self.free = list(range(max_sessions))[::-1]    # rows of no session, row 0 on top
+        self.lock = threading.Lock()
+        self.updates = 0
+        self.resets = 0             # samples that (re)started a session
+        self.residual_sum = 0.0     # sum of |measurement - prediction| over the filtered samples
+
+    @classmethod
+    def from_noise(cls, process_noise, measurement_noise, dt, **options):
+        """
+        Description: Predictor with the steady state gains for samples every dt seconds.
+        Parameters:
+            process_noise: float (units/s^2), how hard the target accelerates
+            measurement_noise: float (units), jitter of a sample
+            dt: float (s), sample interval
+        """
+        alpha, beta = tracking_gains(process_noise * dt**2 / measurement_noise)
+        return cls(alpha=alpha, beta=beta, **options)
+
+    def _row(self, session):
+        row = self.rows.get(session)
+        if row is None:
+            row = self.free.pop() if self.free else self.rows.popitem(last=False)[1]
+            self.rows[session] = row
+            self.stamp[row] = -math.inf
+        self.rows.move_to_end(session)
+        return row
+
+    def update(self, session, measurement, t=None, lead=None):
+        """
+        Description: Filter a new sample of session and predict it lead seconds ahead.
+        Parameters:
+            session: hashable, e.g. the client connection's (host, port)
+            measurement: sequence of dims floats
+            t: float (s), sample time on any clock consistent within the session (time.monotonic() when None)
+            lead: float (s), horizon of this prediction (self.lead when None)
+        return:
+            predicted: (dims,) ndarray
+        """
+        measurement = np.asarray(measurement, dtype=float)
+        t = time.monotonic() if t is None else t
+        lead = self.lead if lead is None else lead
+        with self.lock:
+            self.updates += 1
+            row = self._row(session)
+            dt = t - self.stamp[row]
+            if not 0 < dt <= self.reset_after:
+                self.resets += 1
+                self.position[row] = measurement
+                self.velocity[row] = 0.0
+            else:
+                predicted = self.position[row] + self.velocity[row] * dt
+                residual = measurement - predicted
+                self.residual_sum += float(np.linalg.norm(residual))
+                self.position[row] = predicted + self.alpha * residual
+                self.velocity[row] += (self.beta / dt) * residual
+                speed = np.linalg.norm(self.velocity[row])
+                if speed > self.max_speed:
+                    self.velocity[row] *= self.max_speed / speed
+            self.stamp[row] = t
+            return self.position[row] + self.velocity[row] * lead
+
+    def reset(self, session):
+        with self.lock:
+            row = self.rows.get(session)
+            if row is not None:
+                self.stamp[row] = -math.inf
+
+    def forget(self, session):
+        """
+        Description: Free the row of session, e.g. when its client disconnects.
+        """
+        with self.lock:
+            row = self.rows.pop(session, None)
+            if row is not None:
+                self.free.append(row)
+
+    def stats(self):
+        """
+        return:
+            dict: sessions, updates, resets and mean residual (units) of the filtered samples
+        """
+        filtered = self.updates - self.resets
+        return {
+            "sessions": len(self.rows),
+            "updates": self.updates,
+            "resets": self.resets,
+            "residual_mean": self.residual_sum / filtered if filtered else 0.0,
+        }
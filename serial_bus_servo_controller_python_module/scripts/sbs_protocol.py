@@ -0,0 +1,198 @@
+# coding: utf-8
+"""
+sbs_protocol: Framing of the Serial Bus Servo Controller protocol.
+
+Every packet, in both directions, is laid out as
+    header(0x55 0x55) | length(1) | command value(1) | parameters(length - 2)
+so a whole frame is always length + 2 bytes long.
+"""
+
+HEADER = b'\x55\x55'
+
+# Command values
+CMD_SERVO_MOVE = 0x03
+CMD_GET_BATTERY_VOLTAGE = 0x0F
+CMD_MULT_SERVO_UNLOAD = 0x14
+CMD_MULT_SERVO_POS_READ = 0x15
+
+# Expected length byte for each command: length = base + per_servo * (servo count in parameter 1)
+# Frames sent by the host to the controller.
+REQUEST_FORMATS = {
+    CMD_SERVO_MOVE: (5, 3),
+    CMD_GET_BATTERY_VOLTAGE: (2, 0),
+    CMD_MULT_SERVO_UNLOAD: (3, 1),
+    CMD_MULT_SERVO_POS_READ: (3, 1),
+}
+# Frames sent by the controller back to the host.
+RESPONSE_FORMATS = {
+    CMD_GET_BATTERY_VOLTAGE: (4, 0),
+    CMD_MULT_SERVO_POS_READ: (3, 3),
+}
+
+
+class SBS_TimeoutError(Exception):
+    def __init__(self, cmd, received):
+        """
+        SBS_TimeoutError: Raised when the servo controller does not answer a command before the read deadline.
+        Attributes:
+            cmd: int
+                command value the response was expected for
+            received: bytes
+                bytes received before the deadline expired
+        """
+        super().__init__(f"No response to command 0x{cmd:02X} before deadline ({len(received)} bytes received)")
+        self.cmd = cmd
+        self.received = received
+
+
+class FrameParser:
+    def __init__(self, formats=RESPONSE_FORMATS):
+        """
+        FrameParser: Incremental, resynchronizing parser for 0x55 0x55 framed packets.
+                     Bytes can be fed in chunks of any size; a frame split across chunks is completed
+                     by later calls, and several frames in one chunk are all returned.
+                     Bytes that cannot start a valid frame (noise, truncated or unknown packets) are skipped.
+        Parameters:
+            formats: dict
+                command value -> (base, per_servo) length rule, e.g. RESPONSE_FORMATS or REQUEST_FORMATS
+        """
+        self.formats = formats
+        self.buf = bytearray()
+        self.dropped = 0    # Number of bytes discarded while resynchronizing.
+
+    def _expected_length(self, cmd):
+        """
+        return:
+            length: int, None if more bytes are needed, -1 if the frame at the start of buf is invalid.
+        """
+        base, per_servo = self.formats[cmd]
+        if per_servo == 0:
+            return base
+        if len(self.buf) < 5:
+            return None
+        return base + per_servo * self.buf[4]
+
+    def _skip(self, n):
+        del self.buf[:n]
+        self.dropped += n
+
+    def feed(self, data):
+        """
+        Description: Append received bytes and extract every complete frame.
+        Parameters:
+            data: bytes
+        return:
+            frames: list of bytes (whole frames, header included)
+        """
+        self.buf.extend(data)
+        frames = []
+        while True:
+            start = self.buf.find(HEADER)
+            if start < 0:
+                # Keep a trailing 0x55, it may be the first half of a header.
+                self._skip(len(self.buf) - 1 if self.buf.endswith(HEADER[:1]) else len(self.buf))
+                break
+            if start:
+                self._skip(start)
+            if len(self.buf) < 4:
+                break
+            length, cmd = self.buf[2], self.buf[3]
+            if cmd not in self.formats:
+                self._skip(1)
+                continue
+            expected = self._expected_length(cmd)
+            if expected is None:
+                break
+            if length != expected:
+                self._skip(1)
+                continue
+            if len(self.buf) < length + 2:
+                break
+            frames.append(bytes(self.buf[:length + 2]))
+            del self.buf[:length + 2]
+        return frames
+
+    def reset(self):
+        self.buf.clear()
+
+
+# Encoding (host -> controller). Shared by SBS_Controller and AsyncSBS_Controller.
+def encode_servo_move(servo_id, angle_position, time):
+    """
+    Description: Build a servo move packet (command value 0x03).
+    Parameters: see SBS_Controller.cmd_servo_move
+    return:
+        buf: bytearray
+    """
+    buf = bytearray(HEADER)                     # header
+    buf.extend([0xff & (len(servo_id)*3+5)])    # length (the number of control servo * 3 + 5)
+    buf.extend([CMD_SERVO_MOVE])                # command value
+
+    buf.extend([0xff & len(servo_id)])          # The number of servo to be controlled
+
+    time = 0xffff & time
+    buf.extend([(0xff & time), (0xff & (time >> 8))])   # Lower and Higher 8 bits of time value
+
+    for i in range(len(servo_id)):
+        p_val = 0xffff & angle_position[i]
+        buf.extend([0xff & servo_id[i]])    # servo id
+        buf.extend([(0xff & p_val), (0xff & (p_val >> 8))])   # Lower and Higher 8 bits of angle posiotion value
+    return buf
+
+
+def encode_get_battery_voltage():
+    """
+    Description: Build a battery voltage request packet (command value 0x0F).
+    """
+    buf = bytearray(HEADER)                 # header
+    buf.extend([0x02])                      # length
+    buf.extend([CMD_GET_BATTERY_VOLTAGE])   # command value
+    return buf
+
+
+def _encode_servo_list(cmd, servo_id):
+    buf = bytearray(HEADER)                     # header
+    buf.extend([0xff & (len(servo_id)+3)])      # length (the number of control servo + 3)
+    buf.extend([cmd])                           # command value
+    buf.extend([0xff & len(servo_id)])          # The number of servo to be controlled.
+    for i in range(len(servo_id)):
+        buf.extend([0xff & servo_id[i]])        # servo id
+    return buf
+
+
+def encode_mult_servo_unload(servo_id):
+    """
+    Description: Build a servo unload packet (command value 0x14).
+    """
+    return _encode_servo_list(CMD_MULT_SERVO_UNLOAD, servo_id)
+
+
+def encode_mult_servo_pos_read(servo_id):
+    """
+    Description: Build a servo position read request packet (command value 0x15).
+    """
+    return _encode_servo_list(CMD_MULT_SERVO_POS_READ, servo_id)
+
+
+# Decoding (controller -> host). frame is a whole frame as returned by FrameParser.feed.
+def decode_battery_voltage(frame):
+    """
+    return:
+        battery_voltage: float (V)
+    """
+    battery_voltage = 0xffff & (frame[4] | (0xff00 & (frame[5] << 8)))    # millivolts
+    return battery_voltage / 1000.0
+
+
+def decode_mult_servo_pos(frame, servo_id):
+    """
+    Description: Read the angle positions of servo_id (list) out of a 0x15 response frame.
+                 The response echoes each servo id before its position, so the values are
+                 returned in the order of servo_id.
+    return:
+        angle_pos_values: list (None for a servo missing from the response)
+    """
+    positions = {}
+    for i in range(frame[4]):
+        positions[frame[5+3*i]] = 0xffff & (frame[6+3*i] | (0xff00 & (frame[7+3*i] << 8)))
+    return [positions.get(sid) for sid in servo_id]
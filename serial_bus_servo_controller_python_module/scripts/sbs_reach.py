@@ -0,0 +1,226 @@
+# coding: utf-8
+"""
+sbs_reach: Precomputed reachable workspace of the arm as a voxel grid.
+
+A voxel is reachable when IK (sbs_kinematics.ik_batch, at pitch phi) has a solution for its
+center, on any branch of sbs_kinematics.BRANCHES, with every joint angle within the calibration limits. For every voxel the grid stores
+the flat index of the nearest reachable voxel, so both "is this target reachable" and
+"nearest reachable target" are a single array lookup.
+
+Build it offline, it is slow: at 0.5 cm on an x86 desktop about 20 s for a fixed pitch and 1.5 min
+for any pitch (37 pitches x 4 branches), many times that on a Raspberry Pi. Load it memory-mapped
+at run time. A saved grid is only used while the link lengths, the calibration (both from arm.json,
+see sbs_arm.ArmModel), the pitch and the resolution match: load_current() returns None otherwise,
+load_or_build() rebuilds it.
+
+    python sbs_reach.py                 # writes reach_grid.npy and reach_grid.json next to this file
+    python sbs_reach.py 0.5 0           # same, for a fixed pitch of 0 deg instead of any pitch
+    grid = sbs_reach.ReachGrid.load_current(arm=controller.arm)      # arm.json when arm is None
+    if grid is not None:
+        x, y, z = grid.nearest(x, y, z)
+"""
+import os
+import sys
+
+import numpy as np
+
+import sbs_kinematics
+import sbs_precomputed
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "reach_grid")
+
+# 26 neighbour offsets plus the voxel itself.
+_OFFSETS = [(i, j, k) for i in (-1, 0, 1) for j in (-1, 0, 1) for k in (-1, 0, 1)]
+
+
+def _shifted(a, di, dj, dk, fill):
+    """
+    return:
+        out: array where out[i, j, k] = a[i + di, j + dj, k + dk], fill outside a
+    """
+    out = np.full_like(a, fill)
+    src = tuple(slice(max(d, 0), a.shape[n] + min(d, 0)) for n, d in enumerate((di, dj, dk)))
+    dst = tuple(slice(max(-d, 0), a.shape[n] + min(-d, 0)) for n, d in enumerate((di, dj, dk)))
+    out[dst] = a[src]
+    return out
+
+
+def nearest_seed(seeds):
+    """
+    Description: Jump flooding: for every voxel, the flat index of a nearest voxel where seeds is True
+                 (approximate in rare ties, exact for convex regions). -1 everywhere if there is no seed.
+    Parameters:
+        seeds: bool ndarray, shape (nx, ny, nz)
+    return:
+        nearest: int32 ndarray, shape (nx, ny, nz)
+    """
+    shape = seeds.shape
+    own = np.arange(seeds.size, dtype=np.int32).reshape(shape)
+    nearest = np.where(seeds, own, -1).astype(np.int32)
+    coords = np.indices(shape, dtype=np.int32)
+
+    def dist2(candidate):
+        ci, cj, ck = np.unravel_index(np.maximum(candidate, 0), shape)
+        d = (ci - coords[0])**2 + (cj - coords[1])**2 + (ck - coords[2])**2
+        return np.where(candidate >= 0, d, np.iinfo(np.int32).max)
+
+    best = dist2(nearest)
+    step = 1 << int(np.ceil(np.log2(max(shape))) - 1)
+    steps = []
+    while step >= 1:
+        steps.append(step)
+        step //= 2
+    for step in steps + [1]:   # one extra pass at step 1 fixes most JFA errors
+        for di, dj, dk in _OFFSETS:
+            if di == dj == dk == 0:
+                continue
+            candidate = _shifted(nearest, di * step, dj * step, dk * step, -1)
+            d = dist2(candidate)
+            better = d < best
+            nearest[better] = candidate[better]
+            best[better] = d[better]
+    return nearest
+
+
+class ReachGrid:
+    def __init__(self, nearest, origin, resolution, meta=None):
+        """
+        ReachGrid: Reachable workspace lookup.
+        Parameters:
+            nearest: int32 ndarray, shape (nx, ny, nz) (may be memory-mapped)
+                flat index of the nearest reachable voxel of every voxel
+            origin: (x, y, z) of the center of voxel (0, 0, 0) (cm)
+            resolution: voxel edge length (cm)
+            meta: dict, parameters the grid was built with
+        """
+        self.nearest_index = nearest
+        self.shape = nearest.shape
+        self.origin = tuple(float(v) for v in origin)
+        self.resolution = float(resolution)
+        self.meta = meta or {}
+
+    @staticmethod
+    def parameters(arm=None, phi=None, resolution=0.5):
+        """
+        return:
+            dict of everything the grid content depends on (compared by load_or_build)
+        """
+        return dict(sbs_precomputed.arm_parameters(sbs_precomputed.default_arm(arm)),
+                    phi=phi, resolution=resolution, branches=len(sbs_kinematics.BRANCHES))
+
+    @classmethod
+    def build(cls, arm=None, phi=None, resolution=0.5):
+        """
+        Description: Compute the grid over the cube enclosing the fully stretched arm.
+        Parameters:
+            arm: sbs_arm.ArmModel, links and joint limits (arm.json when None)
+            phi: float (deg), end effector pitch the targets are solved with, or None for any pitch
+                 ik_free_pitch searches (its coarse pass candidates, tcp_server's default)
+            resolution: float (cm)
+        """
+        arm = sbs_precomputed.default_arm(arm)
+        calibration = arm.calibration
+        l1, l2, l3 = arm.links
+        extent = arm.extent
+        n = int(np.ceil(2 * extent / resolution)) + 1
+        axis = -extent + resolution * np.arange(n)
+        X, Y, Z = np.meshgrid(axis, axis, axis, indexing="ij")
+        targets = np.stack([X.ravel(), Y.ravel(), Z.ravel(), np.empty(X.size)], axis=1)
+        seeds = np.zeros(X.size, dtype=bool)
+        phis = [phi] if phi is not None else np.linspace(*sbs_kinematics.PITCH_RANGE, sbs_kinematics.PITCH_STEPS)
+        for candidate in phis:
+            for branch in range(len(sbs_kinematics.BRANCHES)):
+                todo = np.flatnonzero(~seeds)   # voxels no earlier pitch or branch reached
+                targets[todo, 3] = candidate
+                angles, valid = sbs_kinematics.ik_batch(targets[todo], l1, l2, l3, branch)
+                within = np.ones(len(angles), dtype=bool)
+                for n in range(4):
+                    # Any turn of the joint within its limits will do.
+                    within &= np.any([(angles[:, n] + turn >= calibration.angle_min[n]) & (angles[:, n] + turn <= calibration.angle_max[n])
+                                      for turn in (-360, 0, 360)], axis=0)
+                seeds[todo] = valid & within
+        seeds = seeds.reshape(X.shape)
+        meta = cls.parameters(arm, phi, resolution)
+        meta["reachable_voxels"] = int(seeds.sum())
+        return cls(nearest_seed(seeds), (axis[0],) * 3, resolution, meta)
+
+    def save(self, path=DEFAULT_PATH):
+        sbs_precomputed.save(path, self.nearest_index,
+                             dict(self.meta, origin=self.origin, resolution=self.resolution, shape=list(self.shape)))
+
+    @classmethod
+    def load(cls, path=DEFAULT_PATH):
+        """
+        Description: Load a saved grid; the voxel array is memory-mapped, not read.
+        """
+        nearest, meta = sbs_precomputed.load(path)
+        return cls(nearest, meta.pop("origin"), meta["resolution"], meta)
+
+    @classmethod
+    def load_current(cls, path=DEFAULT_PATH, arm=None, **parameters):
+        """
+        Description: Load the saved grid if it was built with the same parameters (see parameters()).
+        Parameters:
+            arm: sbs_arm.ArmModel (arm.json when None)
+            parameters: phi, resolution of build()
+        return:
+            grid, or None when it is missing or out of date
+        """
+        return sbs_precomputed.load_current(cls, path, dict(parameters, arm=sbs_precomputed.default_arm(arm)))
+
+    @classmethod
+    def load_or_build(cls, path=DEFAULT_PATH, arm=None, **parameters):
+        """
+        Description: Load the saved grid if it was built with the same parameters (see parameters()),
+                     otherwise build it, save it and return it.
+        Parameters:
+            arm: sbs_arm.ArmModel (arm.json when None)
+            parameters: phi, resolution of build()
+        """
+        return sbs_precomputed.load_or_build(cls, path, dict(parameters, arm=sbs_precomputed.default_arm(arm)))
+
+    def _voxel(self, x, y, z):
+        """
+        return:
+            (i, j, k) of the voxel containing the point clamped to the grid, inside: bool
+        """
+        ijk = []
+        inside = True
+        for v, o, n in zip((x, y, z), self.origin, self.shape):
+            i = int(round((v - o) / self.resolution))
+            if i < 0 or i >= n:
+                inside = False
+                i = min(max(i, 0), n - 1)
+            ijk.append(i)
+        return tuple(ijk), inside
+
+    def reachable(self, x, y, z):
+        ijk, inside = self._voxel(x, y, z)
+        if not inside:
+            return False
+        i, j, k = ijk
+        return int(self.nearest_index[i, j, k]) == (i * self.shape[1] + j) * self.shape[2] + k
+
+    def nearest(self, x, y, z):
+        """
+        Description: The target itself if it is reachable, otherwise the center of the nearest reachable voxel.
+        return:
+            (x, y, z)
+        """
+        ijk, inside = self._voxel(x, y, z)
+        i, j, k = ijk
+        flat = int(self.nearest_index[i, j, k])
+        if inside and flat == (i * self.shape[1] + j) * self.shape[2] + k:
+            return x, y, z
+        if flat < 0:
+            raise ValueError("The reach grid has no reachable voxel")
+        ni, nj, nk = np.unravel_index(flat, self.shape)
+        return tuple(o + self.resolution * int(n) for o, n in zip(self.origin, (ni, nj, nk)))
+
+
+if __name__ == "__main__":
+    resolution = float(sys.argv[1]) if len(sys.argv) > 1 else 0.5
+    phi = float(sys.argv[2]) if len(sys.argv) > 2 else None
+    grid = ReachGrid.build(phi=phi, resolution=resolution)
+    grid.save()
+    print(f"Reach grid {grid.shape} at {resolution} cm: {grid.meta['reachable_voxels']} reachable voxels, saved to {DEFAULT_PATH}.npy")
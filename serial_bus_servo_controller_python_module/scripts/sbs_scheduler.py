@@ -0,0 +1,128 @@
+# coding: utf-8
+import threading
+import time
+from collections import deque
+
+from sbs_encoder import packet_size
+
+
+def wire_time(nbytes, baud_rate, bits_per_byte=10):
+    """
+    Description: Time a frame occupies the serial link.
+    Parameters:
+        nbytes: int
+        baud_rate: int
+        bits_per_byte: int
+            10 for 8N1 (start bit + 8 data bits + stop bit)
+    return:
+        seconds: float
+    """
+    return nbytes * bits_per_byte / baud_rate
+
+
+def run_fixed_rate(period, stop_event, tick):
+    """
+    Description: Call tick() every period seconds until stop_event is set, on a time.monotonic() deadline
+                 schedule so the sleep time does not add up. A tick that overruns moves the schedule on
+                 instead of running the missed ticks back to back.
+    Parameters:
+        period: float (s)
+        stop_event: threading.Event
+        tick: function without arguments
+    """
+    deadline = time.monotonic()
+    while not stop_event.is_set():
+        tick()
+        deadline += period
+        delay = deadline - time.monotonic()
+        if delay < 0:
+            deadline = time.monotonic()     # fell behind, do not try to catch up
+            delay = 0
+        stop_event.wait(delay)
+
+
+class BusScheduler:
+    def __init__(self, baud_rate=9600, max_backlog=0.03, window=2.0, clock=time.monotonic):
+        """
+        BusScheduler: Transmit budget of the controller link.
+                      Tracks when the link will have finished sending everything written so far
+                      (writes beyond that point only queue up in the kernel and reach the servos late).
+                      A frame fits the budget while the backlog it would create stays under max_backlog.
+        Parameters:
+            baud_rate: int
+            max_backlog: float (s)
+                e.g. max_backlog = 0.03 (just over move_time(), one 6 servo move)
+            window: float (s)
+                length of the sliding window used for utilization()
+            clock: function returning seconds, time.monotonic by default
+        """
+        self.baud_rate = baud_rate
+        self.max_backlog = max_backlog
+        self.window = window
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.busy_until = 0.0       # when the link finishes sending what was written
+        self.history = deque()      # (time written, wire time) inside the utilization window
+        self.frames = 0
+        self.bytes = 0
+
+    def frame_time(self, nbytes):
+        return wire_time(nbytes, self.baud_rate)
+
+    def move_time(self, servos=6):
+        """
+        return:
+            seconds: float, wire time of a move packet for servos servos (26 ms for 6 at 9600 baud)
+        """
+        return self.frame_time(packet_size(servos))
+
+    def delay(self, nbytes):
+        """
+        Description: How long to wait before nbytes fit the budget.
+                     An idle link always takes the frame, even one longer than max_backlog.
+        return:
+            seconds: float (0 if they can be written now)
+        """
+        with self.lock:
+            now = self.clock()
+            if self.busy_until <= now:
+                return 0.0
+            backlog = self.busy_until - now + self.frame_time(nbytes)
+            return max(backlog - self.max_backlog, 0.0)
+
+    def commit(self, nbytes):
+        """
+        Description: Account for nbytes written to the link.
+        """
+        with self.lock:
+            now = self.clock()
+            t = self.frame_time(nbytes)
+            self.busy_until = max(self.busy_until, now) + t
+            self.history.append((now, t))
+            self.frames += 1
+            self.bytes += nbytes
+            self._expire(now)
+
+    def _expire(self, now):
+        while self.history and self.history[0][0] < now - self.window:
+            self.history.popleft()
+
+    def utilization(self):
+        """
+        return:
+            utilization: float, fraction of the last window the link spent transmitting
+                         (above 1.0 when more was written than the link can carry)
+        """
+        with self.lock:
+            self._expire(self.clock())
+            return sum(t for _, t in self.history) / self.window
+
+    def stats(self):
+        utilization = self.utilization()
+        with self.lock:
+            return {
+                "utilization": utilization,
+                "backlog": max(self.busy_until - self.clock(), 0.0),
+                "frames": self.frames,
+                "bytes": self.bytes,
+            }
@@ -0,0 +1,109 @@
+# coding: utf-8
+import threading
+import time
+from collections import namedtuple
+
+from sbs_protocol import SBS_TimeoutError
+from sbs_scheduler import run_fixed_rate
+
+
+class TelemetrySnapshot(namedtuple("TelemetrySnapshot", [
+        "servo_id",         # tuple of polled servo ids
+        "positions",        # tuple of angle positions, same order as servo_id (None until the first read)
+        "positions_time",   # time.monotonic() of the position read, None until the first read
+        "battery_voltage",  # float (V), None until the first read
+        "battery_time",     # time.monotonic() of the battery read, None until the first read
+        "timeouts",         # number of reads that timed out so far
+        "errors",           # number of polls that failed otherwise (serial error, stopped worker, ...)
+        "last_error",       # str of the last such error, None if there was none
+])):
+    def positions_age(self, now=None):
+        """
+        return:
+            age: float (s) since positions were read, None if never read
+        """
+        if self.positions_time is None:
+            return None
+        return (time.monotonic() if now is None else now) - self.positions_time
+
+    def battery_age(self, now=None):
+        if self.battery_time is None:
+            return None
+        return (time.monotonic() if now is None else now) - self.battery_time
+
+
+class TelemetryPoller:
+    def __init__(self, controller, servo_id=(6, 5, 4, 3, 2, 1), rate_hz=5.0, battery_every=10):
+        """
+        TelemetryPoller: Reads servo positions (and the battery voltage every battery_every polls)
+                         in a background thread and publishes them as an immutable TelemetrySnapshot.
+                         Readers just take poller.snapshot: no lock and no bus round trip.
+                         A poll is skipped when moves are waiting for the bus (SBS_Worker attached)
+                         or the link still has a transmit backlog, so telemetry makes way for motion.
+        Parameters:
+            controller: SBS_Controller
+            servo_id: iterable
+                e.g. servo_id = (6, 5, 4, 3, 2, 1)
+            rate_hz: float
+                polls per second
+            battery_every: int
+                read the battery voltage once every battery_every polls
+        """
+        self.controller = controller
+        self.servo_id = tuple(servo_id)
+        self.period = 1.0 / rate_hz
+        self.battery_every = battery_every
+        self.snapshot = TelemetrySnapshot(self.servo_id, None, None, None, None, 0, 0, None)
+        self.skipped = 0    # polls skipped to make way for moves
+        self.count = 0      # polls run
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name="sbs-telemetry", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def _bus_busy(self):
+        worker = self.controller.worker
+        if worker is not None and worker.pending_moves():
+            return True
+        return self.controller.bus.stats()["backlog"] > 0
+
+    def poll(self, read_battery=False):
+        """
+        Description: Read once and publish a new snapshot. A failed read is counted in the snapshot
+                     (timeouts, errors) and keeps the previous values, whose age keeps growing.
+        """
+        snap = self.snapshot
+        try:
+            positions = tuple(self.controller.cmd_mult_servo_pos_read(list(self.servo_id)))
+            snap = snap._replace(positions=positions, positions_time=time.monotonic())
+            if read_battery:
+                voltage = self.controller.cmd_get_battery_voltage()
+                snap = snap._replace(battery_voltage=voltage, battery_time=time.monotonic())
+        except SBS_TimeoutError:
+            snap = snap._replace(timeouts=snap.timeouts + 1)
+        except Exception as e:
+            # The poller must outlive a failing bus: count the error and poll again next period.
+            if str(e) != snap.last_error:
+                print(f"[SBS_TELEMETRY]: poll failed: {e}")
+            snap = snap._replace(errors=snap.errors + 1, last_error=str(e))
+        self.snapshot = snap    # single reference assignment: readers see the old or the new snapshot
+
+    def _tick(self):
+        if self._bus_busy():
+            self.skipped += 1
+            return
+        self.poll(read_battery=(self.count % self.battery_every == 0))
+        self.count += 1
+
+    def _run(self):
+        run_fixed_rate(self.period, self.stop_event, self._tick)
@@ -0,0 +1,196 @@
+# coding: utf-8
+"""
+sbs_trajectory: Smooth joint space trajectories through waypoints, sampled and encoded ahead of time.
+
+Every joint (and the gripper) follows a minimum jerk profile that stops at each waypoint, or a clamped
+cubic spline that passes through the waypoints without stopping and starts and ends at rest. All joints
+and samples are evaluated at once with NumPy, and the samples are encoded into one contiguous buffer of
+move packets (sbs_encoder.encode_trajectory), so playing the trajectory only writes bytes:
+
+    trajectory = sbs_trajectory.JointTrajectory.through_poses(controller.arm, poses, times, wrist=90, grip=500)
+    trajectory.play(controller)
+
+    python benchmarks/bench_trajectory.py     # tracking error and bus traffic against linear Cartesian steps
+"""
+import math
+import time
+
+import numpy as np
+
+from sbs_encoder import encode_trajectory, packet_size
+
+
+def min_jerk(s):
+    """
+    return:
+        progress in [0, 1] of a minimum jerk move at normalized time s in [0, 1]
+        (zero velocity and acceleration at both ends)
+    """
+    return s**3 * (10 - 15 * s + 6 * s**2)
+
+
+def _segments(times, t):
+    """
+    return:
+        seg: (K,) index of the waypoint segment of every sample time
+        s: (K,) normalized time within it, in [0, 1]
+        h: (K,) segment durations
+    """
+    seg = np.clip(np.searchsorted(times, t, side="right") - 1, 0, len(times) - 2)
+    h = times[seg + 1] - times[seg]
+    return seg, np.clip((t - times[seg]) / h, 0.0, 1.0), h
+
+
+def min_jerk_profile(waypoints, times, t):
+    """
+    Description: Minimum jerk between consecutive waypoints, at rest at every waypoint.
+    Parameters:
+        waypoints: (M, J) joint values
+        times: (M,) increasing waypoint times (s)
+        t: (K,) sample times (s)
+    return:
+        samples: (K, J)
+    """
+    seg, s, _ = _segments(times, t)
+    return waypoints[seg] + (waypoints[seg + 1] - waypoints[seg]) * min_jerk(s)[:, None]
+
+
+def spline_velocities(waypoints, times):
+    """
+    Description: Knot velocities of the clamped cubic spline (zero velocity at the first and last waypoint,
+                 continuous acceleration at the others).
+    return:
+        velocities: (M, J)
+    """
+    M = len(times)
+    velocities = np.zeros_like(waypoints)
+    if M < 3:
+        return velocities
+    h = np.diff(times)
+    slope = np.diff(waypoints, axis=0) / (h**2)[:, None]
+    # Row i (interior knot i + 1): v[i] / h[i] + 2 v[i+1] (1 / h[i] + 1 / h[i+1]) + v[i+2] / h[i+1] = 3 (slope[i] + slope[i+1])
+    A = np.diag(2 * (1 / h[:-1] + 1 / h[1:])) + np.diag(1 / h[1:-1], 1) + np.diag(1 / h[1:-1], -1)
+    velocities[1:-1] = np.linalg.solve(A, 3 * (slope[:-1] + slope[1:]))
+    return velocities
+
+
+def cubic_spline_profile(waypoints, times, t):
+    """
+    Description: Clamped cubic spline through the waypoints (cubic Hermite segments with spline_velocities).
+    Parameters: see min_jerk_profile
+    return:
+        samples: (K, J)
+    """
+    velocities = spline_velocities(waypoints, times)
+    seg, s, h = _segments(times, t)
+    s2, s3 = s**2, s**3
+    h00, h10, h01, h11 = 2 * s3 - 3 * s2 + 1, s3 - 2 * s2 + s, 3 * s2 - 2 * s3, s3 - s2
+    return (h00[:, None] * waypoints[seg] + (h10 * h)[:, None] * velocities[seg]
+            + h01[:, None] * waypoints[seg + 1] + (h11 * h)[:, None] * velocities[seg + 1])
+
+
+PROFILES = {
+    "minjerk": min_jerk_profile,
+    "spline": cubic_spline_profile,
+}
+
+
+class JointTrajectory:
+    def __init__(self, calibration, waypoints, times, profile="minjerk", rate_hz=20.0):
+        """
+        JointTrajectory: A sampled joint space trajectory and its move packets.
+                         Sample k is the pose at times[0] + k / rate_hz (k >= 1, the last one at the final
+                         waypoint); its packet is sent one period earlier and moves the servos there in one period.
+        Parameters:
+            calibration: sbs_calibration.Calibration
+            waypoints: array-like, shape (M, 6)
+                theta_6, theta_1, theta_2, theta_3, wrist (deg, see cmd_move_with_angle) and grip (angle position)
+            times: array-like, shape (M,), increasing (s)
+            profile: str, key of PROFILES
+            rate_hz: float, samples per second
+        """
+        waypoints = np.asarray(waypoints, dtype=float)
+        times = np.asarray(times, dtype=float)
+        if len(times) < 2 or len(times) != len(waypoints) or np.any(np.diff(times) <= 0):
+            raise ValueError("A trajectory needs at least 2 waypoints at increasing times")
+        if not np.all(np.isfinite(waypoints)):
+            raise ValueError(f"Waypoints must be finite: {waypoints}")
+        self.calibration = calibration
+        self.waypoints = waypoints
+        self.period = 1.0 / rate_hz
+        self.period_ms = int(round(self.period * 1000))
+        count = int(math.ceil((times[-1] - times[0]) / self.period - 1e-9))
+        self.times = np.minimum(times[0] + np.arange(1, count + 1) * self.period, times[-1])
+        self.start = times[0]
+        self.samples = PROFILES[profile](waypoints, times, self.times)
+        positions, clamped = calibration.to_positions(self.samples[:, :5])
+        self.clamped = clamped.any(axis=0)     # (5,) joints clamped somewhere along the trajectory
+        grip = np.rint(self.samples[:, 5:]).astype(int)
+        self.positions = np.hstack([positions, grip])
+        self.servo_id = list(calibration.servo_id) + [1]
+        self.packet_size = packet_size(len(self.servo_id))
+        self.packets = encode_trajectory(self.servo_id, self.positions, self.period_ms)
+
+    @classmethod
+    def through_poses(cls, arm, poses, times, wrist, grip, previous=None, profile="minjerk", rate_hz=20.0):
+        """
+        Description: Trajectory through end effector poses. Each pose is solved with arm.ik_nearest from
+                     the previous one, so the arm stays on one branch and never turns a joint the long way.
+        Parameters:
+            arm: sbs_arm.ArmModel
+            poses: list of (x, y, z, phi): cm and deg
+            times: list (s), one per pose
+            wrist: float or list (deg), wrist rotation
+            grip: int or list, gripper (servo 1) angle position
+            previous: (theta_base, theta_1, theta_2, theta_3) (rad) the arm starts from, e.g.
+                      calibration.to_angles_radians(controller.commanded_positions[:4]), None for any
+        raises:
+            ValueError: a pose is out of reach
+        """
+        joints = []
+        for x, y, z, phi in poses:
+            *angles, valid, _ = arm.ik_nearest(x, y, z, math.radians(phi), previous)
+            if not valid:
+                raise ValueError(f"Pose out of reach: {(x, y, z, phi)}")
+            joints.append(angles)
+            previous = angles
+        waypoints = np.column_stack([np.rad2deg(joints), np.broadcast_to(wrist, len(poses)), np.broadcast_to(grip, len(poses))])
+        return cls(arm.calibration, waypoints, times, profile, rate_hz)
+
+    def __len__(self):
+        return len(self.times)
+
+    def packet(self, k):
+        """
+        return:
+            packet: memoryview of the move packet of sample k
+        """
+        return memoryview(self.packets)[k * self.packet_size:(k + 1) * self.packet_size]
+
+    def play(self, controller, stop_event=None):
+        """
+        Description: Send the packets on a time.monotonic() schedule (blocks until the end, or until
+                     stop_event is set). A packet whose slot has already passed by a whole period is
+                     skipped rather than sent late.
+        Parameters:
+            controller: SBS_Controller
+            stop_event: threading.Event, optional
+        return:
+            sent: int, packets sent
+        """
+        t0 = time.monotonic()
+        sent = 0
+        for k, deadline in enumerate((self.times - self.start - self.period).tolist()):
+            delay = t0 + deadline - time.monotonic()
+            if delay > 0:
+                if stop_event is not None:
+                    if stop_event.wait(delay):
+                        break
+                else:
+                    time.sleep(delay)
+            elif -delay >= self.period:
+                continue
+            positions = self.positions[k].tolist()
+            controller.cmd_move_packet(self.packet(k), positions[:5], positions[5])
+            sent += 1
+        return sent
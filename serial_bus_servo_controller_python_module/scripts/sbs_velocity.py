@@ -0,0 +1,146 @@
+# coding: utf-8
+import math
+import threading
+import time
+
+import numpy as np
+
+from sbs_scheduler import run_fixed_rate
+
+
+class VelocityStreamer:
+    def __init__(self, controller, rate_hz=20.0, timeout=0.25, damping=0.5, max_joint_speed=120.0):
+        """
+        VelocityStreamer: Cartesian velocity control of the end effector.
+                          The client streams velocities with set_velocity(); a background thread integrates
+                          them into joint angles through the analytic Jacobian (ArmModel.jacobian) at
+                          rate_hz and sends each step as a move lasting one control period, so the arm
+                          follows within a period instead of a whole planned move.
+                          The arm stops when no velocity arrives for timeout seconds.
+        Parameters:
+            controller: SBS_Controller, with the arm already moved once (the integration starts from
+                        controller.commanded_positions, and restarts from them whenever another caller moves the arm)
+            rate_hz: float
+                control steps per second, a period no shorter than controller.bus.move_time() (one 6 servo move)
+            timeout: float (s)
+            damping: float (cm)
+                damped least squares factor, keeps joint speeds bounded near singular poses
+            max_joint_speed: float (deg/s)
+                the joint velocity vector is scaled down so no joint exceeds it
+        """
+        self.controller = controller
+        self.period = 1.0 / rate_hz
+        self.timeout = timeout
+        self.damping = damping
+        self.max_joint_speed = math.radians(max_joint_speed)
+        self.lock = threading.Lock()
+        self.velocity = np.zeros(4)     # vx, vy, vz (cm/s), vphi (rad/s)
+        self.velocity_time = 0.0        # time.monotonic() of the last set_velocity
+        self.wrist = None               # set by the client, None to keep the commanded one
+        self.grip = None
+        self.changed = False            # wrist or grip set since the last step
+        self.joints = None              # integrated (theta_base, theta_1, theta_2, theta_3) (rad)
+        self.commanded_wrist = None     # wrist rotation of the pose the integration started from (deg)
+        self.sent_positions = None      # controller.commanded_positions after our last step
+        self.steps = 0                  # moves sent
+        self.errors = 0                 # steps whose move raised
+        self.last_error = None          # str of the last one
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name="sbs-velocity", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def set_velocity(self, vx, vy, vz, vphi=0.0, wrist=None, grip=None):
+        """
+        Parameters:
+            vx, vy, vz: float (cm/s), end effector velocity
+            vphi: float (deg/s), pitch velocity in the arm plane
+            wrist: float (deg), wrist rotation, None to keep it
+            grip: int, gripper (servo 1) angle position, None to keep it
+        """
+        with self.lock:
+            self.velocity = np.array([vx, vy, vz, math.radians(vphi)], dtype=float)
+            self.velocity_time = time.monotonic()
+            if wrist is not None and wrist != self.wrist:
+                self.wrist = wrist
+                self.changed = True
+            if grip is not None and grip != self.grip:
+                self.grip = grip
+                self.changed = True
+
+    def stop_motion(self):
+        with self.lock:
+            self.velocity = np.zeros(4)
+
+    def _sync(self):
+        """
+        Description: Restart the integration from the commanded joints when someone else moved the arm.
+        return:
+            True when there is a commanded pose to integrate from
+        """
+        positions = self.controller.commanded_positions
+        if positions is None:
+            return False
+        if positions != self.sent_positions:
+            angles = self.controller.calibration.to_angles_radians(positions)
+            self.joints = np.array(angles[:4])
+            self.commanded_wrist = math.degrees(angles[4])
+            self.sent_positions = positions
+            with self.lock:
+                # The wrist and gripper were commanded too: keep them until the client sets them again.
+                self.wrist = self.grip = None
+        return True
+
+    def step(self, dt):
+        """
+        Description: Integrate the current velocity over dt and send the move.
+        return:
+            clamped: list of servo ids held at their joint limit, None when nothing was sent
+        """
+        with self.lock:
+            velocity = self.velocity
+            if time.monotonic() - self.velocity_time > self.timeout:
+                velocity = self.velocity = np.zeros(4)
+            wrist, grip, changed = self.wrist, self.grip, self.changed
+            self.changed = False
+        if not self._sync() or not (velocity.any() or changed):
+            return None
+
+        J = self.controller.arm.jacobian(*self.joints)
+        # Damped least squares: qdot = J^T (J J^T + damping^2 I)^-1 v
+        qdot = J.T @ np.linalg.solve(J @ J.T + self.damping**2 * np.eye(4), velocity)
+        qdot /= max(np.abs(qdot).max() / self.max_joint_speed, 1.0)
+        calibration = self.controller.calibration
+        joints = np.clip(self.joints + qdot * dt, np.deg2rad(calibration.angle_min[:4]), np.deg2rad(calibration.angle_max[:4]))
+
+        if grip is None:
+            grip = self.controller.commanded.get(1, 500)
+        clamped = self.controller.cmd_move_with_angle(*np.rad2deg(joints).tolist(), self.commanded_wrist if wrist is None else wrist,
+                                                      grip, int(self.period * 1000))
+        self.joints = joints
+        self.sent_positions = self.controller.commanded_positions
+        self.steps += 1
+        return clamped
+
+    def _tick(self):
+        try:
+            self.step(self.period)
+        except Exception as e:
+            # Velocity mode outlives a failing bus: the next step retries from the joints last sent.
+            if str(e) != self.last_error:
+                print(f"[SBS_VELOCITY]: step failed: {e}")
+            self.errors += 1
+            self.last_error = str(e)
+
+    def _run(self):
+        run_fixed_rate(self.period, self.stop_event, self._tick)
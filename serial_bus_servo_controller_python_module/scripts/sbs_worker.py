@@ -0,0 +1,173 @@
+# coding: utf-8
+import threading
+from collections import deque
+
+from sbs_encoder import packet_size
+
+
+class _Call:
+    def __init__(self, func, args):
+        self.func = func
+        self.args = args
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def run(self):
+        try:
+            self.result = self.func(*self.args)
+        except Exception as e:
+            self.error = e
+        self.done.set()
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class SBS_Worker:
+    def __init__(self, controller):
+        """
+        SBS_Worker: Single owner thread for the serial port of an SBS_Controller.
+                    Once attached, every cmd_* call on the controller made from another thread
+                    (TCP client handlers, Flask requests, ...) is handed to this thread instead of
+                    writing to the shared serial.Serial directly.
+                    - Moves are coalesced per servo: a newer target for a servo replaces a pending one,
+                      so bursts of VR updates do not queue up behind the 9600 baud link. Moves whose
+                      duration was planned are planned again from the positions written when they are sent.
+                    - Reads and other commands are queued in order and the caller blocks until
+                      the worker has run them.
+                    - When both moves and reads are pending the worker alternates between them.
+                    - Moves are sent one packet (move time) at a time, each held back while it does not fit
+                      the controller's BusScheduler budget; targets arriving meanwhile merge into them
+                      instead of queueing behind them.
+        Parameters:
+            controller: SBS_Controller
+        """
+        self.controller = controller
+        self.cond = threading.Condition()
+        self.moves = {}         # servo id -> (angle position, time or None to plan it when sent), latest wins
+        self.calls = deque()    # pending _Call, in submission order
+        self.running = True
+        self.sent_moves = 0     # move packets written to the port
+        self.coalesced = 0      # servo targets replaced before they were sent
+        self.thread = threading.Thread(target=self._run, name="sbs-worker", daemon=True)
+        controller.worker = self
+        self.thread.start()
+
+    def submit_move(self, servo_id, angle_position, time):
+        """
+        Description: Queue a move without waiting for it to be written.
+                     Parameters are the same as SBS_Controller.cmd_servo_move, time None plans the
+                     duration with controller.planner when the move is written.
+        """
+        with self.cond:
+            for sid, pos in zip(servo_id, angle_position):
+                if sid in self.moves:
+                    self.coalesced += 1
+                self.moves[sid] = (pos, time)
+            self.cond.notify()
+
+    def call(self, func, *args):
+        """
+        Description: Run func(*args) on the worker thread and wait for its result.
+                     Exceptions raised by func are re-raised in the calling thread.
+        """
+        call = _Call(func, args)
+        with self.cond:
+            if not self.running:
+                raise RuntimeError("SBS_Worker is stopped")
+            self.calls.append(call)
+            self.cond.notify()
+        return call.wait()
+
+    def pending_moves(self):
+        with self.cond:
+            return len(self.moves)
+
+    def stats(self):
+        """
+        return:
+            stats: dict, BusScheduler.stats() plus sent move packets and merged servo targets
+        """
+        stats = self.controller.bus.stats()
+        stats["sent_moves"] = self.sent_moves
+        stats["merged"] = self.coalesced
+        return stats
+
+    def stop(self):
+        """
+        Description: Stop the worker thread and detach it from the controller.
+                     Pending moves are dropped, pending calls are still run.
+        """
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        self.thread.join()
+        # Detach first: the pending calls then write to the port themselves instead of coming back to us.
+        self.controller.worker = None
+        while self.calls:
+            self.calls.popleft().run()
+
+    @staticmethod
+    def _group_moves(moves):
+        # One packet per distinct move time, since cmd_servo_move has a single time for all servos.
+        groups = {}
+        for sid, (pos, time) in moves.items():
+            ids, positions = groups.setdefault(time, ([], []))
+            ids.append(sid)
+            positions.append(pos)
+        return groups
+
+    def _next_moves(self):
+        """
+        return:
+            moves: dict, the pending moves of one packet (the servos sharing the first pending move time)
+        """
+        time = next(iter(self.moves.values()))[1]
+        return {sid: move for sid, move in self.moves.items() if move[1] == time}
+
+    def _moves_delay(self):
+        # Budget one packet at a time: the packets of all pending move times together may never fit.
+        return self.controller.bus.delay(packet_size(len(self._next_moves())))
+
+    def _send_moves(self, moves):
+        for time, (ids, positions) in self._group_moves(moves).items():
+            if time is None:
+                # From where the servos were last sent: the target it was first planned from may have been merged away.
+                time = self.controller.planner.duration(ids, positions, self.controller.sent)
+            self.controller.cmd_servo_move(ids, positions, time)
+            self.sent_moves += 1
+
+    def _run(self):
+        moves_turn = True
+        while True:
+            with self.cond:
+                while self.running and not self.moves and not self.calls:
+                    self.cond.wait()
+                if not self.running:
+                    return
+                delay = self._moves_delay() if self.moves else 0.0
+                if delay > 0 and not self.calls:
+                    # Over budget: wait for the link, newer targets keep merging into self.moves.
+                    self.cond.wait(delay)
+                    continue
+                if self.moves and delay == 0 and (moves_turn or not self.calls):
+                    moves = self._next_moves()
+                    for sid in moves:
+                        del self.moves[sid]
+                    call = None
+                else:
+                    moves = None
+                    call = self.calls.popleft()
+                moves_turn = call is not None
+
+            if call is not None:
+                call.run()
+                continue
+            try:
+                self._send_moves(moves)
+            except Exception as e:
+                print(f"[SBS_WORKER]: move failed: {e}")
@@ -1,11 +1,20 @@
 # coding: utf-8
 import serial
 import time
+import math
+import threading
 import numpy as np
+from collections import deque
 import vr_scaling
+import sbs_protocol
+from sbs_protocol import FrameParser, RESPONSE_FORMATS, SBS_TimeoutError
+from sbs_encoder import MoveEncoder
+from sbs_scheduler import BusScheduler
+from sbs_arm import ArmModel
+from sbs_planner import MovePlanner
 
 class SBS_Controller:
-    def __init__(self, dev, baud_rate=9600):
+    def __init__(self, dev, baud_rate=9600, timeout=0.5, move_quantum=1, ik_cache=None, ik_table=None, pitch_budget=0.002, arm=None, planner=None):
         """
         SBS_Controller: Serial Bus Servo controller class.
                         By using this class, you can control servos with Serial Bus Servo Controller.
@@ -24,10 +33,101 @@ class SBS_Controller:
                        On the other hand, LSC Series Servo Controller communication Baud Rate is 9600 baud.
                        For this reason, You have to select 9600 baud.
                        Don't get confused.)
+            timeout: float (s)
+                e.g. timeout = 0.5
+                (note. Maximum time to wait for a response. SBS_TimeoutError is raised when it expires.)
+            move_quantum: int
+                e.g. move_quantum = 1
+                (note. cmd_move_with_angle only sends the servos whose position changed by at least
+                       move_quantum since it was last commanded. 0 sends every servo every time.)
+            ik_cache: sbs_cache.IKCache
+                e.g. ik_cache = sbs_cache.IKCache(quantum=0.1)
+                (note. Optional. move_end_effector then reuses the servo positions of targets seen before,
+                       quantized to ik_cache.quantum.)
+            ik_table: sbs_iktable.IKTable
+                e.g. ik_table = sbs_iktable.IKTable.load_or_build(arm=arm)
+                (note. Optional. move_end_effector then interpolates the joint angles of targets the table
+                       covers and solves the others exactly. It must be built for arm, ValueError otherwise.)
+            pitch_budget: float
+                e.g. pitch_budget = 0.002
+                (note. Time (s) move_end_effector may spend searching the pitch when it is not given.)
+            arm: sbs_arm.ArmModel
+                e.g. arm = sbs_arm.ArmModel.load()
+                (note. Link lengths and joint calibration, loaded from arm.json when not given.)
+            planner: sbs_planner.MovePlanner
+                e.g. planner = sbs_planner.MovePlanner(arm.servo_limits, min_duration=20)
+                (note. Plans the duration of moves given duration None, from the servo limits of arm when not given.)
         """
-        self.ser = serial.Serial(dev, baud_rate)
+        arm = arm or ArmModel.load()
+        if ik_table is not None and not ik_table.built_for(arm):
+            raise ValueError("ik_table was built for another arm model, see IKTable.load_or_build(arm=...)")
+        self.timeout = timeout
+        self.ser = serial.Serial(dev, baud_rate, timeout=timeout)
+        self.parser = FrameParser(RESPONSE_FORMATS)
+        self.responses = {}     # command value -> deque of frames received but not yet claimed
+        self.worker = None      # sbs_worker.SBS_Worker owning the port, if one is attached
+        self.encoder = MoveEncoder()
+        self.bus = BusScheduler(baud_rate)     # wire time accounting of everything written
+        self.move_quantum = move_quantum
+        self.commanded = {}     # servo id -> last commanded angle position
+        self.sent = {}          # servo id -> last angle position written to the bus (the worker may merge commanded ones away)
+        self.arm = arm
+        self.calibration = self.arm.calibration
+        self.commanded_positions = None     # joint servo positions of the last cmd_move_with_angle / move_end_effector
+        self.ik_cache = ik_cache
+        self.ik_table = ik_table
+        self.ik_branch = None       # sbs_kinematics.BRANCHES index of the last move_end_effector solution
+        self.pitch_budget = pitch_budget
+        self.planner = planner or MovePlanner(self.arm.servo_limits)
+        self.last_duration = None   # duration (ms) of the last move submitted by cmd_move_with_angle / move_end_effector
+        self.last_pitch = None      # end effector pitch (deg) of the last move_end_effector, chosen when p is None
 
-    def cmd_servo_move(self, servo_id, angle_position, time):
+    def _write(self, buf):
+        self.ser.write(buf)
+        self.bus.commit(len(buf))
+
+    def _use_worker(self):
+        """
+        Description: True when commands must be handed to the attached worker thread
+                     instead of touching the serial port from the calling thread.
+        """
+        worker = self.worker
+        return worker is not None and threading.current_thread() is not worker.thread
+
+    def _discard_responses(self, cmd):
+        """
+        Description: Drop every response to command value cmd received so far, including frames still
+                     waiting in the port. Called before sending a request: there is at most one request per
+                     command in flight, so anything older is the late reply to a request that timed out.
+        """
+        waiting = self.ser.in_waiting
+        if waiting:
+            for frame in self.parser.feed(self.ser.read(waiting)):
+                self.responses.setdefault(frame[3], deque(maxlen=16)).append(frame)
+        self.responses.pop(cmd, None)
+
+    def _read_response(self, cmd):
+        """
+        Description: Wait for the next 0x55 0x55 framed response to command value cmd.
+                     Received bytes go through a resynchronizing FrameParser, so stray bytes are skipped
+                     and responses to other commands are kept (in order) for the caller waiting on them.
+                     The thread sleeps in the kernel while it waits instead of polling inWaiting().
+        return:
+            frame: bytes (the whole frame, header included)
+        """
+        deadline = time.monotonic() + self.timeout
+        pending = self.responses.setdefault(cmd, deque(maxlen=16))
+        while not pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise SBS_TimeoutError(cmd, bytes(self.parser.buf))
+            self.ser.timeout = remaining
+            data = self.ser.read(max(1, self.ser.in_waiting))
+            for frame in self.parser.feed(data):
+                self.responses.setdefault(frame[3], deque(maxlen=16)).append(frame)
+        return pending.popleft()
+
+    def cmd_servo_move(self, servo_id, angle_position, time, planned=False):
         """
         Description: Control the rotation of any servo.
                      The rotation time of all servos commanded by this function will be the same.
@@ -39,53 +139,40 @@ class SBS_Controller:
                 (note. The number of elements must be the same as servo_id)
             time: int (ms)
                 e.g. time = 1000    
+            planned: bool
+                time was planned by the planner from self.sent. The worker plans it again when it writes
+                the packet, since the pending moves it was planned after may be merged away by then.
         return:
         """
-        buf = bytearray(b'\x55\x55')                # header 
-        buf.extend([0xff & (len(servo_id)*3+5)])    # length (the number of control servo * 3 + 5)
-        buf.extend([0x03])                          # command value
+        self.commanded.update(zip(servo_id, angle_position))
+        if self._use_worker():
+            self.worker.submit_move(servo_id, angle_position, None if planned else time)
+            return
 
-        buf.extend([0xff & len(servo_id)])          # The number of servo to be controlled
-        
-        time = 0xffff & time
-        buf.extend([(0xff & time), (0xff & (time >> 8))])   # Lower and Higher 8 bits of time value
-
-        for i in range(len(servo_id)):
-            p_val = 0xffff & angle_position[i]
-            buf.extend([0xff & servo_id[i]])    # servo id
-            buf.extend([(0xff & p_val), (0xff & (p_val >> 8))])   # Lower and Higher 8 bits of angle posiotion value
+        self._write_move(self.encoder.encode(servo_id, angle_position, time), servo_id, angle_position)
 
-        self.ser.write(buf)
+    def _write_move(self, buf, servo_id, angle_position):
+        self.sent.update(zip(servo_id, angle_position))
+        self._write(buf)
 
     def cmd_get_battery_voltage(self):
         """
         Description: Get the servo controller's battery voltage in unit millivolts.
         return: 
             battery_voltage: float (V)
+        raises:
+            SBS_TimeoutError: no response before the timeout
         """
-        # transmit
-        buf = bytearray(b'\x55\x55')    # header 
-        buf.extend([0x02])              # length
-        buf.extend([0x0F])              # command value
-        # Empty the contents of the cache in preparation for receiving data.
-        count = self.ser.inWaiting()    # Check receive cache.
-        if count != 0:
-            _ = self.ser.read(count)    # Read out data
-        # Send command.
-        self.ser.write(buf)
+        if self._use_worker():
+            return self.worker.call(self.cmd_get_battery_voltage)
 
-        # Receive
-        count = 0
-        recv_cmd_len = 6
-        while count != recv_cmd_len:        # Waiting for reception to finish.
-            count = self.ser.inWaiting()
-        recv_data = self.ser.read(count)    # Read the received byte data.
-        if count == recv_cmd_len:                      # Check if the number of bytes of data received is correct as a response to this command.
-            if recv_data[0] == 0x55 and recv_data[1] == 0x55 and recv_data[3] == 0x0F : # Check if the received data is a response to a command.
-                battery_voltage = 0xffff & (recv_data[4] | (0xff00 & (recv_data[5] << 8))) # Read battery  voltage
-                battery_voltage = battery_voltage / 1000.0
+        # Send command.
+        self._discard_responses(sbs_protocol.CMD_GET_BATTERY_VOLTAGE)
+        self._write(sbs_protocol.encode_get_battery_voltage())
 
-        return battery_voltage
+        # Receive (raises SBS_TimeoutError if the controller does not answer)
+        recv_data = self._read_response(sbs_protocol.CMD_GET_BATTERY_VOLTAGE)
+        return sbs_protocol.decode_battery_voltage(recv_data)
 
     def cmd_mult_servo_unload(self, servo_id):
         """
@@ -95,16 +182,14 @@ class SBS_Controller:
                 e.g. servo_id = [1, 2, 3, 4]     
         return:
         """
-        buf = bytearray(b'\x55\x55')                # header 
-        buf.extend([0xff & (len(servo_id)+3)])      # length (the number of control servo + 3)
-        buf.extend([0x14])                          # command value
+        for sid in servo_id:
+            self.commanded.pop(sid, None)   # position unknown once the motor is off
+        if self._use_worker():
+            return self.worker.call(self.cmd_mult_servo_unload, servo_id)
 
-        buf.extend([0xff & len(servo_id)])          # The number of servo to be controlled.
-
-        for i in range(len(servo_id)):
-            buf.extend([0xff & servo_id[i]])    # servo id
-
-        self.ser.write(buf)      
+        for sid in servo_id:
+            self.sent.pop(sid, None)
+        self._write(sbs_protocol.encode_mult_servo_unload(servo_id))
 
     def cmd_mult_servo_pos_read(self, servo_id):
         """
@@ -115,36 +200,20 @@ class SBS_Controller:
         return: 
             angle_pos_values: list 
                 note. The list size is the same as the number of servos you want to get values.
+                      None for a servo that is missing from the response.
+        raises:
+            SBS_TimeoutError: no response before the timeout
         """
-        # transmit
-        buf = bytearray(b'\x55\x55')            # header 
-        buf.extend([0xff & (len(servo_id)+3)])  # length (the number of control servo + 3)
-        buf.extend([0x15])                      # command value
-        buf.extend([0xff & len(servo_id)])          # The number of servo to be controlled.
-
-        for i in range(len(servo_id)):
-            buf.extend([0xff & servo_id[i]])    # servo id
+        if self._use_worker():
+            return self.worker.call(self.cmd_mult_servo_pos_read, servo_id)
 
-        # Empty the contents of the cache in preparation for receiving data.
-        count = self.ser.inWaiting()    # Check receive cache.
-        if count != 0:
-            _ = self.ser.read(count)    # Read out data
         # Send command.
-        self.ser.write(buf)
+        self._discard_responses(sbs_protocol.CMD_MULT_SERVO_POS_READ)
+        self._write(sbs_protocol.encode_mult_servo_pos_read(servo_id))
 
-        # Receive
-        count = 0
-        recv_cmd_len = len(servo_id) * 3 + 5
-        angle_pos_values = servo_id.copy()  # Create a list whose size is the same as the number of servos you want to get values from.
-        while count != recv_cmd_len:        # Waiting for reception to finish.
-            count = self.ser.inWaiting()
-        recv_data = self.ser.read(count)    # Read the received byte data.
-        if count == recv_cmd_len:           # Check if the number of bytes of data received is correct as a response to this command.
-            if recv_data[0] == 0x55 and recv_data[1] == 0x55 and recv_data[3] == 0x15:  # Check if the received data is a response to a command.
-                for i in range(len(servo_id)):
-                    angle_pos_values[i] = 0xffff & (recv_data[6+3*i] | (0xff00 & (recv_data[7+3*i] << 8))) # Read battery  voltage
-
-        return angle_pos_values
+        # Receive (raises SBS_TimeoutError if the controller does not answer)
+        recv_data = self._read_response(sbs_protocol.CMD_MULT_SERVO_POS_READ)
+        return sbs_protocol.decode_mult_servo_pos(recv_data, servo_id)
      
     def angle_to_servo(self, angle, min_angle, max_angle, min_pos, max_pos):
         return int(np.interp(angle, [min_angle, max_angle], [min_pos, max_pos]))
@@ -154,88 +223,155 @@ class SBS_Controller:
         
     def clamp_angle(self, angle, min_val, max_val):
         return max(min(angle, max_val), min_val)
+
+    def changed_servos(self, servo_id, angle_position):
+        """
+        Description: Keep only the servos whose target differs from the last commanded position
+                     by at least move_quantum (servos never commanded are always kept).
+        return:
+            servo_id, angle_position: lists
+        """
+        ids, positions = [], []
+        for sid, pos in zip(servo_id, angle_position):
+            last = self.commanded.get(sid)
+            if last is None or abs(pos - last) >= self.move_quantum:
+                ids.append(sid)
+                positions.append(pos)
+        return ids, positions
         
     def cmd_move_with_angle(self, theta_6, theta_1, theta_2, theta_3, wrist, grip, duration):
-        servo_ranges = {
-            6: {"angle_min": -90, "angle_max": 90, "pos_min": 100, "pos_max":860},
-            5: {"angle_min": 0, "angle_max": 180, "pos_min": 250, "pos_max": 690},
-            4: {"angle_min": -135, "angle_max": 127, "pos_min": 1000, "pos_max": 0},
-            3: {"angle_min": -103, "angle_max": 120, "pos_min": 75, "pos_max": 1000},
-            2: {"angle_min": 0, "angle_max": 180, "pos_min": 900, "pos_max": 20}
-        }  
-        
-        # Check if Joint Angles are valid
-        angles = {
-            6: theta_6,
-            5: theta_1,
-            4: theta_2,
-            3: theta_3,
-            2: wrist
-        }
-        
-        for servo_id, angle in angles.items():
-            min_angle = servo_ranges[servo_id]["angle_min"]
-            max_angle = servo_ranges[servo_id]["angle_max"]
-            clamped_angle = self.clamp_angle(angle, min_angle, max_angle)
-            
-            if clamped_angle != angle:
-                print(f"[ANGLE_ERROR]: Servo {servo_id}: angle {angle} out of range ({min_angle} to {max_angle}) | Map Servo {servo_id} = {clamped_angle}")
-                
-            angles[servo_id] = clamped_angle
-        
-        servo_6_pos = self.angle_to_servo(angles[6], servo_ranges[6]["angle_min"], servo_ranges[6]["angle_max"], servo_ranges[6]["pos_min"], servo_ranges[6]["pos_max"])
-        servo_5_pos = self.angle_to_servo(angles[5], servo_ranges[5]["angle_min"], servo_ranges[5]["angle_max"], servo_ranges[5]["pos_min"], servo_ranges[5]["pos_max"])
-        servo_4_pos = self.angle_to_servo(angles[4], servo_ranges[4]["angle_min"], servo_ranges[4]["angle_max"], servo_ranges[4]["pos_min"], servo_ranges[4]["pos_max"])
-        servo_3_pos = self.angle_to_servo(angles[3], servo_ranges[3]["angle_min"], servo_ranges[3]["angle_max"], servo_ranges[3]["pos_min"], servo_ranges[3]["pos_max"])
-        servo_2_pos = self.angle_to_servo(angles[2], servo_ranges[2]["angle_min"], servo_ranges[2]["angle_max"], servo_ranges[2]["pos_min"], servo_ranges[2]["pos_max"])
-        
-        self.cmd_servo_move([6, 5, 4, 3, 2, 1], [servo_6_pos, servo_5_pos, servo_4_pos, servo_3_pos, servo_2_pos, grip], duration)
-      
-    
+        """
+        Description: Move the arm to the given joint angles (deg).
+                     Angles outside the joint limits of the arm model (arm.json) are clamped.
+        Parameters:
+            theta_6, theta_1, theta_2, theta_3, wrist: float (deg)
+                base (servo 6), shoulder (servo 5), elbow (servo 4), wrist pitch (servo 3), wrist rotation (servo 2)
+            grip: int
+                gripper (servo 1) angle position
+            duration: int (ms), or None for the shortest one the servo limits allow (see planner)
+        return:
+            clamped: list
+                ids of the servos whose angle was out of range and clamped, e.g. [4]
+        raises:
+            ValueError: an angle is NaN or infinite
+        """
+        angles = [theta_6, theta_1, theta_2, theta_3, wrist]
+        if not np.all(np.isfinite(angles)):
+            raise ValueError(f"Joint angles must be finite: {angles}")
+        positions, clamped = self.calibration.to_positions(angles)
+        self.ik_branch = None
+        return self._move_joints(positions.tolist(), clamped, grip, duration)
+
+    def _move_joints(self, positions, clamped, grip, duration):
+        self.commanded_positions = positions
+        # Only send the joints that moved, a shorter packet takes less time on the 9600 baud link.
+        all_id = list(self.calibration.servo_id) + [1]
+        servo_id, positions = self.changed_servos(all_id, positions + [grip])
+        if servo_id:
+            planned = duration is None
+            if planned:
+                # Paced by the servo with the longest travel from the position last written to the bus.
+                duration = self.planner.duration(servo_id, positions, self.sent)
+            self.cmd_servo_move(servo_id, positions, duration, planned)
+        self.last_duration = duration
+        return self.calibration.clamped_servos(clamped)
+
+    def cmd_move_packet(self, packet, positions, grip):
+        """
+        Description: Send a move packet of all joints and the gripper encoded beforehand
+                     (e.g. sbs_trajectory.JointTrajectory), through the worker when one is attached.
+        Parameters:
+            packet: bytes-like, move packet of calibration.servo_id + [1]
+            positions: list, joint servo positions it moves to (calibration.servo_id order)
+            grip: int, gripper (servo 1) angle position it moves to
+        """
+        self.commanded_positions = positions
+        self.ik_branch = None
+        all_id = list(self.calibration.servo_id) + [1]
+        self.commanded.update(zip(all_id, positions + [grip]))
+        if self._use_worker():
+            self.worker.call(self._write_move, packet, all_id, positions + [grip])
+        else:
+            self._write_move(packet, all_id, positions + [grip])
+
+    def achieved_pose(self):
+        """
+        Description: End effector pose the servos were last commanded to by cmd_move_with_angle,
+                     after joint limit clamping and position quantization (forward kinematics).
+        return:
+            (x, y, z, phi): cm and deg, None before the first move
+        """
+        if self.commanded_positions is None:
+            return None
+        angles = self.calibration.to_angles([self.commanded_positions])
+        return tuple(self.arm.fk_batch(angles)[0].tolist())
+
     def move_end_effector(self, x3, y3, z3, p, wrist, grip, t):
-        # Length of arm segments in cm
-        l1 = 10
-        l2 = 9.9
-        l3 = 10.2
-        
-        # ~ x3, y3 = vr_scaling.scale_vr_to_arm(x3, y3)
-	
-        phi = np.deg2rad(p)
-        #Calculate the horizontal distance to the targeton XY plane
-        r3 = np.sqrt(x3**2 + y3**2)
-	
-        # Calculate theta_base 
-        theta_base = np.arctan2(y3, x3)
-	
-        # Get r2 and z2
-        r2 = r3 - l3*np.cos(phi)
-        z2 = z3 - l3*np.sin(phi)
-        
-        # ~ max_reach = l1 + l2
-        # ~ current_distance = np.sqrt(r2**2 + z2**2)
-	
-        # ~ if current_distance > max_reach:
-            # ~ scale_factor = max_reach / current_distance
-            # ~ r2 *= scale_factor
-            # ~ z2 *= scale_factor
-            # ~ print(f"Target out of reach. Moving to closest reachable point: ({r2:.2f}, {z2:.2f})")
-	
-        c2 = (r2**2 + z2**2 - l1**2 - l2**2)/(2*l1*l2)
-        c2 = np.clip(c2, -1.0, 1.0)
-        s2 = -np.sqrt(1-c2**2)
-        theta_2 = np.arctan2(s2, c2)
-	
-        s1 = ((l1 + l2*c2)*z2 - l2*s2*r2)/(r2**2 + z2**2)
-        c1 = ((l1 + l2*c2)*r2 + l2*s2*z2)/(r2**2 + z2**2)
-        theta_1 = np.arctan2(s1, c1)
-	
-        theta_3 = phi - theta_1 - theta_2
-	
-        # ~ print('theta_base: ', np.rad2deg(theta_base))
-        # ~ print('theta_1: ', np.rad2deg(theta_1))
-        # ~ print('theta_2: ', np.rad2deg(theta_2))
-        # ~ print('theta_3: ', np.rad2deg(theta_3)) 
-        print(f"[Servo_6]: {np.rad2deg(theta_base)}; [Servo_5]: {np.rad2deg(theta_1)}; [Servo_4]: {np.rad2deg(theta_2)}; [theta_3]: {np.rad2deg(theta_3)}")
-	
-        self.cmd_move_with_angle(np.rad2deg(theta_base), np.rad2deg(theta_1), np.rad2deg(theta_2), np.rad2deg(theta_3), wrist, grip, t)    
+        """
+        Description: Move the end effector to (x3, y3, z3) with pitch p.
+                     Of all IK solutions (sbs_kinematics.ik_nearest), takes the one within the joint limits
+                     closest to the currently commanded joints, so the arm does not flip its elbow or turn
+                     its base around between close targets.
+                     Uses the scalar math fast path (sbs_kinematics.ik_nearest, Calibration.to_positions_radians).
+                     Without a pitch, searches the one that keeps every joint within its limits with the
+                     least joint travel (sbs_kinematics.ik_free_pitch, within pitch_budget); when no pitch
+                     does, the pitch is 0 and the joints are clamped like with a given pitch.
+                     Nothing is sent for a target out of reach: project it first, e.g. with sbs_reach.ReachGrid.
+        Parameters:
+            x3, y3, z3: float (cm)
+            p: float (deg), end effector pitch, or None to choose it (see last_pitch)
+            wrist: float (deg), wrist rotation
+            grip: int, gripper (servo 1) angle position
+            t: int (ms), or None for the shortest duration the servo limits allow
+        return:
+            clamped: list, see cmd_move_with_angle
+        raises:
+            ValueError: the target is out of reach
+        """
+        key = entry = None
+        # A free pitch depends on the commanded joints, not only on the branch: not cached.
+        if self.ik_cache is not None and p is not None:
+            # The solution also depends on the branch the arm is on: entries are stored under the branch
+            # they chose, so the first solve (no branch yet) is found again once the arm is on it.
+            key = self.ik_cache.key(x3, y3, z3, p, wrist)
+            entry = self.ik_cache.get(key + (self.ik_branch,))
+        if entry is not None:
+            positions, clamped, branch = entry
+        else:
+            solution = None
+            branch = 0
+            if p is None:
+                previous = None
+                if self.commanded_positions is not None:
+                    previous = self.calibration.to_angles(self.commanded_positions)[:4]
+                angles, phi, valid, branch = self.arm.ik_free_pitch(x3, y3, z3, previous, budget=self.pitch_budget)
+                if valid:
+                    p = phi
+                    solution = [math.radians(a) for a in angles]
+                else:
+                    p = 0.0     # solved and clamped below, or found out of reach
+            # The table holds branch 0 within the joint limits, which ik_nearest keeps to while the arm is on it.
+            elif self.ik_table is not None and self.ik_branch in (None, 0):
+                solution = self.ik_table.solve(x3, y3, z3, math.radians(p))
+                base_min, base_max = self.calibration.radian_ranges[0][:2]
+                if solution is not None and not base_min <= solution[0] <= base_max:
+                    # Behind the base: the table only covers the arm plane, ik_nearest turns the base around.
+                    solution = None
+            if solution is None:
+                previous = None
+                if self.commanded_positions is not None:
+                    previous = self.calibration.to_angles_radians(self.commanded_positions[:4])
+                *solution, valid, branch = self.arm.ik_nearest(x3, y3, z3, math.radians(p), previous)
+                if not valid:
+                    raise ValueError(f"Target out of reach: ({x3}, {y3}, {z3}) at pitch {p} deg")
+            theta_base, theta_1, theta_2, theta_3 = solution
+            print(f"[Servo_6]: {math.degrees(theta_base)}; [Servo_5]: {math.degrees(theta_1)}; [Servo_4]: {math.degrees(theta_2)}; [theta_3]: {math.degrees(theta_3)}")
+
+            positions, clamped = self.calibration.to_positions_radians((theta_base, theta_1, theta_2, theta_3, math.radians(wrist)))
+            if key is not None:
+                self.ik_cache.put(key + (branch,), (positions, clamped, branch))
+        clamped = self._move_joints(list(positions), clamped, grip, t)
+        self.ik_branch = branch
+        self.last_pitch = p
         print("Movement Executed Successfully\n")
+        return clamped
@@ -4,14 +4,44 @@ import threading
 import json
 import time
 import signal
+import os
 import sys
 import numpy as np
 sys.path.append("/home/raspberrypi/ECE_1896/xarm_case_a/serial_bus_servo_controller_python_module/scripts")
 
 import serial_bus_servo_controller as sbsc
+import sbs_worker
+import sbs_reach
+import sbs_velocity
+import sbs_executor
+import sbs_predictor
+import sbs_gate
 import time
-controller = sbsc.SBS_Controller("/dev/ttyAMA0")
-prev_pose = None
+# End effector pitch (deg) sent with every target, or None to let the controller pick the pitch that keeps
+# every joint within its limits with the least joint travel.
+PITCH = None
+# Duration (ms) of position moves, or None for the shortest one the servo speed and acceleration limits
+# allow (arm.json "servo_limits"): small corrections finish in tens of ms, large moves are not rushed.
+MOVE_DURATION = None
+# No IK cache (sbs_cache.IKCache): it only applies to a fixed pitch, a free pitch depends on where the arm comes from.
+controller = sbsc.SBS_Controller(os.environ.get("SBS_DEVICE", "/dev/ttyAMA0"))
+# All client handler threads share one serial port: let a single worker thread own it.
+serial_worker = sbs_worker.SBS_Worker(controller)
+# Velocity mode: clients send {"vx", "vy", "vz"} (cm/s, same axes as x, y, z) instead of a position.
+velocity_streamer = sbs_velocity.VelocityStreamer(controller, rate_hz=20)
+# Smooth moves: straight line trajectories sent at a fixed rate from a background thread. A new goal
+# preempts the current one, so the handler never blocks while the arm moves.
+trajectory_executor = sbs_executor.TrajectoryExecutor(controller, rate_hz=20)
+# Latency hiding: how far ahead (s) of each VR sample to aim, roughly tunnel latency + move time, or None to
+# act on samples as they are. The alpha-beta gains trade smoothing (low) against following quickly (high),
+# see sbs_predictor.tracking_gains. Samples may carry the client's time stamp "t" (s).
+PREDICT_LEAD = None
+predictor = sbs_predictor.AlphaBetaPredictor(dims=3, alpha=0.5, beta=0.1, lead=PREDICT_LEAD) if PREDICT_LEAD else None
+# Targets that moved less than the thresholds (cm, deg, grip positions) since the last one commanded are dropped
+# before IK, the serial write and the log lines. Targets coming faster than max_rate_hz per client wait for the
+# interval, the latest one is then moved to (move_deferred).
+input_gate = sbs_gate.InputGate(position_threshold=0.2, wrist_threshold=1.0, grip_threshold=5, max_rate_hz=10,
+	on_deferred=lambda *target: move_deferred(*target))
 
 def log(message):
     global log_socket
@@ -41,42 +71,6 @@ def graceful_shutdown(signum, frame):
 signal.signal(signal.SIGTERM, graceful_shutdown)
 signal.signal(signal.SIGINT, graceful_shutdown)  # Optional: Ctrl+C too
 
-def interpolate_and_move(arm, prev_pose, new_pose, steps=10, total_duration=2.0):
-        """
-        Smoothly interpolate from prev_pose to new_pose
-        :param prev_pose: (x, y, z, phi)
-        :param new_pose: (x, y, z, phi)
-        :param steps: Number of interpolation steps
-        :param total_duration: Total time in seconds to finish interpolation
-        :return: new_pose
-        """
-        if prev_pose is None:
-            # First move, no interpolation needed
-            arm.move_end_effector(*new_pose, t=int(total_duration * 1000))
-            return new_pose
-
-        prev_x, prev_y, prev_z, prev_phi = prev_pose
-        new_x, new_y, new_z, new_phi = new_pose
-
-        step_duration = total_duration / steps
-
-        for i in range(1, steps + 1):
-            ratio = i / steps
-            interp_x = prev_x + (new_x - prev_x) * ratio
-            interp_y = prev_y + (new_y - prev_y) * ratio
-            interp_z = prev_z + (new_z - prev_z) * ratio
-            interp_phi = prev_phi + (new_phi - prev_phi) * ratio
-        
-            log_msg = f"Interpolate Position step [{i}]: {interp_x} {interp_y} {interp_z} | Duration: {int(step_duration*1000)}"
-            log(log_msg)
-            print(log_msg)
-
-            # Send interpolated pose to the arm
-            arm.move_end_effector(interp_x, interp_y, interp_z, interp_phi, int(step_duration * 1000))
-            time.sleep(step_duration)  # Optional: allow the arm to catch up
-
-        return new_pose
-
 # AWS EC2 details
 EC2_HOST = "ec2-18-218-93-102.us-east-2.compute.amazonaws.com"
 HOST = '0.0.0.0'
@@ -112,16 +106,84 @@ def setup_log_socket():
 # ~ server_socket.listen(5)    
 # ~ log(f"TCP Server listening on {HOST}:{PORT}...")
 
-MAX_REACH = 29.5
-def scale_to_reach(x, y, z, max_reach):
-	distance = np.sqrt(x**2 + y**2 + z**2)
-	if distance > max_reach:
-		scale = max_reach / distance
-		x *= scale 
-		y *= scale 
-		z *= scale
-	return x, y, z
-	
+# Report serial bus load, so we can see when the VR stream outruns the 9600 baud link.
+BUS_REPORT_PERIOD = 10.0
+BUS_WARN_UTILIZATION = 0.8
+
+def bus_monitor():
+	while True:
+		time.sleep(BUS_REPORT_PERIOD)
+		stats = serial_worker.stats()
+		if stats["frames"] == 0:
+			continue
+		level = "WARNING: " if stats["utilization"] > BUS_WARN_UTILIZATION else ""
+		log(f"{level}Serial bus utilization: {stats['utilization']*100:.0f}% | Move packets sent: {stats['sent_moves']} | Targets merged: {stats['merged']}")
+		if trajectory_executor.ticks:
+			ex = trajectory_executor.stats()
+			log(f"Trajectory ticks: {ex['ticks']} | Late: mean {ex['late_mean']*1000:.1f} ms, p99 {ex['late_p99']*1000:.1f} ms, max {ex['late_max']*1000:.1f} ms | Overruns: {ex['overruns']} | Preempted: {ex['preempted']} | Errors: {ex['errors']}")
+		gate = input_gate.stats()
+		log(f"Input gate: {gate['passed']} targets passed | Deferred: {gate['deferred']} | Dropped: {gate['dropped_deadband']} in the dead-band, {gate['dropped_rate']} over the rate limit ({gate['drop_rate']*100:.0f}%)")
+		if predictor is not None and predictor.updates:
+			pr = predictor.stats()
+			log(f"Predictor: {pr['updates']} samples from {pr['sessions']} sessions | Restarts: {pr['resets']} | Mean residual: {pr['residual_mean']:.2f} cm")
+
+# Reachable workspace of the controller's arm at PITCH, built offline (python sbs_reach.py, minutes on the Pi).
+# Never built here: without a grid matching arm.json and PITCH, targets go to the controller unprojected.
+reach_grid = sbs_reach.ReachGrid.load_current(arm=controller.arm, phi=PITCH)
+if reach_grid is None:
+	log(f"WARNING: No reach grid for the current arm.json and PITCH = {PITCH}, out of reach targets are not projected. Build it with sbs_reach.py.")
+
+POSE_ERROR_WARN = 0.5 # cm
+
+# Client handlers and the gate's timer thread both command targets: one at a time, so the controller state
+# (commanded positions, last duration, ...) stays consistent and a deferred target can check it is still the latest.
+command_lock = threading.RLock()
+
+def command_target(x, y, z, wrist, grip, duration=None):
+	"""
+	Description: Move to a target that passed the input gate, over duration (s) along a straight line,
+	             or at once when duration is None.
+	return:
+		response: str, for the client
+	"""
+	with command_lock:
+		return _command_target(x, y, z, wrist, grip, duration)
+
+def _command_target(x, y, z, wrist, grip, duration):
+	if reach_grid is not None and not reach_grid.reachable(x, y, z):
+		x, y, z = reach_grid.nearest(x, y, z)
+		log(f"Target out of reach. Moving to closest reachable point: ({x:.2f}, {y:.2f}, {z:.2f})")
+	if duration is not None:
+		# Smooth move: a straight line over duration (s), preempting the current one.
+		trajectory_executor.goto((x, y, z, PITCH), float(duration), wrist, int(grip))
+		return f"Trajectory to: x = {x}, y = {y}, z = {z} in {duration} s"
+	trajectory_executor.cancel()
+	try:
+		grip = int(grip)
+		clamped = controller.move_end_effector(x, y, z, PITCH, wrist, grip, MOVE_DURATION)
+		if clamped:
+			log(f"Joint limits reached, clamped servos: {clamped}")
+		ax, ay, az, aphi = controller.achieved_pose()
+		error = np.sqrt((ax - x)**2 + (ay - y)**2 + (az - z)**2)
+		if error > POSE_ERROR_WARN:
+			log(f"Achieved pose differs from target by {error:.2f} cm: x = {ax:.2f}, y = {ay:.2f}, z = {az:.2f}, phi = {aphi:.1f}")
+		return f"Received: x = {x}, y = {y}, z = {z}, wrist = {wrist}, grip = {grip} | Achieved: x = {ax:.2f}, y = {ay:.2f}, z = {az:.2f}, phi = {aphi:.1f} | Duration: {controller.last_duration} ms"
+	except ValueError as e:
+		log(f"ValueError during move_end_effector: {e}")
+		return f"Error: {e}"
+	except Exception as e:
+		
+		log(f"Unexpected error during move_end_effector: {e}")
+		return f"Error: {e}"
+
+def move_deferred(session, x, y, z, wrist, grip, duration):
+	# Latest target of a client that came too early for the rate limit, now that the interval is over.
+	with command_lock:
+		if not input_gate.is_current(session, x, y, z, wrist, grip):
+			return	# a newer target of the client passed the gate since, it is commanded instead
+		log(f"Deferred target of {session}: x = {x:.2f}, y = {y:.2f}, z = {z:.2f}, wrist = {wrist}, grip = {grip}")
+		command_target(x, y, z, wrist, grip, duration)
+
 def handle_client(client_socket, client_address):
 	log(f"CONNECTION ESTABLISHED: {client_address}")
 	while True:
@@ -130,9 +192,17 @@ def handle_client(client_socket, client_address):
 			if not data:
 				break # client disconnected
 				
-			log(f"SUCCESS: MESSAGE RECEIVED FROM: {client_address}")
-			
 			data_dict = json.loads(data)
+			if "vx" in data_dict:
+				# Velocity mode ends any trajectory, the executor would fight the velocity steps.
+				trajectory_executor.cancel()
+				# Velocity mode: same axis swap as the position
+				velocity_streamer.set_velocity(data_dict["vx"], data_dict["vz"], data_dict["vy"],
+					wrist=data_dict.get("wrist"), grip=min(int(data_dict["grip"]), 1000) if "grip" in data_dict else None)
+				client_socket.sendall(f"Velocity: steps sent = {velocity_streamer.steps}".encode('utf-8'))
+				continue
+			# A position target ends any velocity motion.
+			velocity_streamer.stop_motion()
 			x = data_dict["x"]
 			z = data_dict["y"]
 			y = data_dict["z"]
@@ -147,20 +217,18 @@ def handle_client(client_socket, client_address):
 			if grip > 1000:
 				grip = 1000
 			
-			log(f"Received: x = {x}, y = {y}, z = {z}, wrist = {wrist}, grip = {grip}")
-			response = ""
-			try:
-				grip = int(grip)
-				controller.move_end_effector(x, y, z, 0, wrist, grip, 900)
-				response = f"Received: x = {x}, y = {y}, z = {z}, wrist = {wrist}, grip = {grip}"
-			except ValueError as e:
-				log(f"ValueError during move_end_effector: {e}")
-				response = f"Error: {e}"
-			except Exception as e:
-				
-				log(f"Unexpected error during move_end_effector: {e}")
-				response = f"Error: {e}"
-				
+			received = (x, y, z)
+			if predictor is not None:
+				# One session per connection: clients on the same host (all of them through the SSH tunnel) are kept apart.
+				x, y, z = predictor.update(client_address, (x, y, z), data_dict.get("t")).tolist()
+			if not input_gate.accept(client_address, x, y, z, wrist, grip, context=data_dict.get("duration")):
+				client_socket.sendall(b"Dropped: target within the dead-band, or deferred by the rate limit")
+				continue
+			log(f"SUCCESS: MESSAGE RECEIVED FROM: {client_address}")
+			log(f"Received: x = {received[0]}, y = {received[1]}, z = {received[2]}, wrist = {wrist}, grip = {grip}")
+			if predictor is not None:
+				log(f"Predicted: x = {x:.2f}, y = {y:.2f}, z = {z:.2f}")
+			response = command_target(x, y, z, wrist, grip, data_dict.get("duration"))
 			client_socket.sendall(response.encode('utf-8'))
 		
 		except json.JSONDecodeError:
@@ -174,12 +242,19 @@ def handle_client(client_socket, client_address):
 			break
 	
 	log(f"Client {client_address} disconnected.")
+	# The address may come back as another client: do not gate or predict its targets from this one's.
+	input_gate.forget(client_address)
+	if predictor is not None:
+		predictor.forget(client_address)
 	client_socket.close()
 			
 def main():
 	global server_socket
 	log("TCP Server Application Starting...")
 	setup_log_socket()
+	threading.Thread(target=bus_monitor, daemon=True).start()
+	velocity_streamer.start()
+	trajectory_executor.start()
 	
 	server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 	server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
@@ -236,7 +311,7 @@ if __name__ == "__main__":
 				# ~ controller.move_end_effector(x, y, z, 0, wrist, grip, 900)
 				
 				# ~ # Option 2: Interpolation Test
-				# ~ prev_pose = interpolate_and_move(controller, prev_pose, (x, y, z, phi), steps=10, total_duration=1.0)
+				# ~ trajectory_executor.goto((x, y, z, PITCH), 1.0, wrist, grip)
 			# ~ except ValueError as e:
 				# ~ log(f"ValueError during move_end_effector: {e}")
 				# ~ response = f"Error: {e}"